@@ -0,0 +1,98 @@
+"""
+Throughput benchmarks for Crawler.crawl_async against a synthetic mock web.
+Run: python bench_crawler.py
+"""
+
+import asyncio
+import random
+import time
+import urllib.parse
+from collections import deque
+
+from crawler import Crawler
+
+
+def synthetic_web(pages: int, hosts: int = 10, links_per_page: int = 8,
+                  seed: int = 0) -> dict[str, list[str]]:
+    """`pages` URLs spread over `hosts` hosts; page i links to random pages plus i + 1,
+    so everything is reachable from page 0"""
+    rng = random.Random(seed)
+    urls = [f"https://h{i % hosts}.test/p{i}" for i in range(pages)]
+    web = {}
+    for i, url in enumerate(urls):
+        links = [urls[rng.randrange(pages)] for _ in range(links_per_page - 1)]
+        if i + 1 < pages:
+            links.append(urls[i + 1])
+        web[url] = links
+    return web
+
+
+def skewed_latency(web: dict[str, list[str]], fast: float = 0.005, slow: float = 0.2,
+                   slow_fraction: float = 0.05, seed: int = 0) -> dict[str, float]:
+    """Most pages answer in `fast` seconds, a slow_fraction tail takes `slow`"""
+    rng = random.Random(seed)
+    return {url: slow if rng.random() < slow_fraction else fast for url in web}
+
+
+class MockWebCrawler(Crawler):
+    """Crawler whose fetch_async serves `web` with per-URL latency and no rate limit"""
+    def __init__(self, web: dict[str, list[str]], latency: dict[str, float], **kwargs):
+        kwargs.setdefault("requests_per_second", 0)
+        super().__init__(**kwargs)
+        self.web = web
+        self.latency = latency
+
+    async def fetch_async(self, url: str) -> list[str]:
+        await asyncio.sleep(self.latency.get(url, 0.0))
+        return self.web.get(url, [])
+
+
+async def lockstep_crawl(crawler: Crawler, start_url: str) -> list[str]:
+    """The previous crawl_async: gather batches of max_concurrent, wait for the slowest"""
+    visited = set()
+    queue = deque([start_url])
+    discovered = []
+    while queue and len(discovered) < crawler.max_pages:
+        batch = []
+        while (queue and len(batch) < crawler.max_concurrent and
+               len(discovered) + len(batch) < crawler.max_pages):
+            url = queue.popleft()
+            if url in visited:
+                continue
+            hostname = urllib.parse.urlparse(url).hostname
+            if crawler.allowed_domains is not None and hostname not in crawler.allowed_domains:
+                continue
+            visited.add(url)
+            discovered.append(url)
+            batch.append(url)
+        for new_urls in await asyncio.gather(*[crawler.fetch_with_retry(url) for url in batch]):
+            queue.extend(new_urls)
+    return discovered
+
+
+def bench_pipelining(pages: int = 2000, concurrency: tuple[int, ...] = (8, 32, 128)) -> None:
+    """pages/sec of lock-step batches vs the worker pool on a 5%-slow-tail web"""
+    web = synthetic_web(pages)
+    latency = skewed_latency(web)
+    start_url = next(iter(web))
+    runs = (("lock-step gather", lambda c: lockstep_crawl(c, start_url), False),
+            ("worker pool", lambda c: c.crawl_async(start_url), False),
+            ("worker pool strict_bfs", lambda c: c.crawl_async(start_url), True))
+    print(f"{pages} pages, 5% at 200ms, rest 5ms")
+    print(f"{'algorithm':<26}{'workers':>8}{'pages/sec':>11}{'pages':>7}")
+    for workers in concurrency:
+        for name, crawl, strict in runs:
+            crawler = MockWebCrawler(web, latency, max_pages=pages, max_concurrent=workers,
+                                     strict_bfs=strict)
+            start = time.perf_counter()
+            found = asyncio.run(crawl(crawler))
+            elapsed = time.perf_counter() - start
+            print(f"{name:<26}{workers:>8}{len(found) / elapsed:>11,.0f}{len(found):>7}")
+
+
+def main() -> None:
+    bench_pipelining()
+
+
+if __name__ == "__main__":
+    main()
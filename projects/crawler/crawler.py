@@ -1,10 +1,12 @@
 import asyncio
 import random
 import time
-import urllib
+import urllib.parse
 from dataclasses import dataclass
 from collections import deque
 
+from frontier import HostFrontier
+
 # Provided mock - used across all levels
 MOCK_WEB = {
     "https://a.com": ["https://a.com/about", "https://b.com"],
@@ -29,12 +31,16 @@ class Crawler:
                         allowed_domains: list[str] | None = None,
                         max_concurrent: int = 1,
                         requests_per_second: float = 10,
-                        max_retries: int = 0):
+                        max_retries: int = 0,
+                        strict_bfs: bool = False,
+                        max_per_host: int | None = None):
         self.max_pages = max_pages
         self.allowed_domains = allowed_domains
         self.max_concurrent = max_concurrent
         self.requests_per_second = requests_per_second
         self.max_retries = max_retries
+        self.strict_bfs = strict_bfs
+        self.max_per_host = max_per_host
         self.bucket = {}
     
     def crawl(self, start_url: str) -> list[str]:
@@ -63,35 +69,84 @@ class Crawler:
         return discovered
     
     async def crawl_async(self, start_url: str) -> list[str]:
-        visited = set()
-        queue = deque([])
-        queue.append(start_url)
+        """Crawl with max_concurrent long-lived workers pulling from a shared frontier.
+
+        A worker starts its next fetch as soon as its current one finishes, so one
+        slow page no longer holds back a whole batch. URLs are marked seen (and
+        domain-filtered) when enqueued, so the frontier never holds duplicates.
+
+        The frontier hands out the oldest URL whose host has a rate-limit token and
+        is under max_per_host in-flight fetches, so workers don't sleep on one
+        exhausted host while others could be fetched. Among ready hosts the order
+        is FIFO, which keeps it close to BFS; with strict_bfs=True each level is
+        finished before the next one starts and the result matches crawl() exactly.
+        """
+        frontier = HostFrontier(ready_at=self._ready_at if self.requests_per_second > 0 else None,
+                                max_per_host=self.max_per_host)
+        seen: set[str] = set()
+        discovered: list[str] = []
+        next_level: dict[int, list[str]] = {}  # strict_bfs: discovered index -> links
+
+        def enqueue(url: str) -> None:
+            if url in seen or len(discovered) >= self.max_pages or not self._allowed(url):
+                return
+            seen.add(url)
+            frontier.put_nowait(url)
+
+        async def worker() -> None:
+            while True:
+                url = await frontier.get()
+                try:
+                    if len(discovered) >= self.max_pages:
+                        continue
+                    index = len(discovered)
+                    discovered.append(url)
+                    links = await self.fetch_with_retry(url)
+                    if self.strict_bfs:
+                        next_level[index] = links
+                    else:
+                        for link in links:
+                            enqueue(link)
+                finally:
+                    frontier.task_done(url)
+
+        enqueue(start_url)
+        workers = [asyncio.create_task(worker()) for _ in range(max(self.max_concurrent, 1))]
+        try:
+            await frontier.join()
+            while next_level:
+                # Enqueue the next level in parent order, as the sequential BFS would
+                for index in sorted(next_level):
+                    for link in next_level[index]:
+                        enqueue(link)
+                next_level.clear()
+                await frontier.join()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
 
-        discovered = []
-        while queue and len(discovered) < self.max_pages:
-            batch = []
-            while (queue and len(batch) < self.max_concurrent and
-                   len(discovered) + len(batch) < self.max_pages):
-                url = queue.popleft()
-                if url in visited:
-                    continue
-                
-                hostname = urllib.parse.urlparse(url).hostname
-                if self.allowed_domains is not None and hostname not in self.allowed_domains:
-                    continue
-
-                visited.add(url)
-                discovered.append(url)
-                batch.append(url)
-
-            tasks = [self.fetch_with_retry(url) for url in batch]
-
-            for new_urls in await asyncio.gather(*tasks):
-                for new_url in new_urls:
-                    queue.append(new_url)
-        
         return discovered
 
+    def _ready_at(self, hostname: str | None) -> float:
+        """When the host's bucket next has a token; peeks without refilling/consuming."""
+        state = self.bucket.get(hostname)
+        if state is None:
+            return 0.0
+        now = time.time()
+        # A bucket smaller than one token (rps < 1) is ready when full; fetch_async waits the rest
+        need = min(1.0, self.requests_per_second)
+        tokens = min(state.tokens + (now - state.last_refill) * self.requests_per_second,
+                     self.requests_per_second)
+        if tokens >= need - 1e-9:
+            return now
+        return now + (need - tokens) / self.requests_per_second
+
+    def _allowed(self, url: str) -> bool:
+        if self.allowed_domains is None:
+            return True
+        return urllib.parse.urlparse(url).hostname in self.allowed_domains
+
     async def fetch_with_retry(self, url: str) -> list[str]:
         # Should try self.max_retries + 1, original try not count retries.
         for attempt in range(self.max_retries + 1):
@@ -108,6 +163,21 @@ class Crawler:
         return []
 
     async def fetch_async(self, url: str) -> list[str]:
+        if self.requests_per_second > 0:
+            await self.throttle(url)
+
+        if self.max_retries > 0:
+            # Intentional exceptions
+            if random.random() < 0.2:
+                raise random.choice(exceptions)
+        else:
+            # No retry and rate limit are not enabled
+            await asyncio.sleep(0.05)
+
+        return MOCK_WEB.get(url, [])
+
+    async def throttle(self, url: str) -> None:
+        """Take a token from the host's bucket, sleeping until one is available."""
         if self.requests_per_second > 0:
             now = time.time()
             hostname = urllib.parse.urlparse(url).hostname
@@ -137,16 +207,6 @@ class Crawler:
             # consume a token
             state.tokens -= 1
             self.bucket[hostname] = state
-        
-        if self.max_retries > 0:
-            # Intentional exceptions
-            if random.random() < 0.2:
-                raise random.choice(exceptions)
-        else:
-            # No retry and rate limit are not enabled
-            await asyncio.sleep(0.05)
-
-        return MOCK_WEB.get(url, [])
     
     def fetch(self, url: str) -> list[str]:
         """Return list of links found on page"""
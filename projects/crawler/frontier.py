@@ -0,0 +1,131 @@
+import asyncio
+import time
+import urllib.parse
+from collections import defaultdict, deque
+from collections.abc import Callable
+from heapq import heappop, heappush
+from itertools import count
+
+
+def hostname(url: str) -> str | None:
+    return urllib.parse.urlparse(url).hostname
+
+
+class HostFrontier:
+    """Politeness-aware frontier with the asyncio.Queue API (put_nowait/get/task_done/join).
+
+    URLs wait in per-host FIFO queues. get() hands out the oldest URL among the
+    hosts that can take a request right now:
+    - ready_at(host) returns the time the host's rate limit next allows a request
+      (it must only peek, not consume); hosts that are not ready yet sit in a
+      heap keyed by that time and are re-checked lazily when it passes
+    - max_per_host caps the URLs of one host between get() and task_done(url)
+    A worker waiting in get() is woken by put_nowait(), task_done() or the
+    earliest ready time, so it never idles while another host has capacity.
+    """
+    def __init__(self, ready_at: Callable[[str | None], float] | None = None,
+                 max_per_host: int | None = None,
+                 clock: Callable[[], float] = time.time,
+                 host_of: Callable[[str], str | None] = hostname) -> None:
+        self.ready_at = ready_at
+        self.max_per_host = max_per_host
+        self._clock = clock
+        self._host_of = host_of
+        self._seq = count()
+        self._queues: dict[str | None, deque[tuple[int, str]]] = {}
+        # every host with queued URLs is in exactly one of these
+        self._ready: list[tuple[int, str | None]] = []  # (seq of head URL, host)
+        self._waiting: list[tuple[float, str | None]] = []  # (ready time, host)
+        self._capped: set[str | None] = set()  # at max_per_host, re-armed by task_done
+        self._in_flight: dict[str | None, int] = defaultdict(int)
+        self._size = 0
+        self._unfinished = 0
+        self._finished = asyncio.Event()
+        self._finished.set()
+        self._wakeup = asyncio.Event()
+
+    def qsize(self) -> int:
+        return self._size
+
+    def empty(self) -> bool:
+        return self._size == 0
+
+    def hosts(self) -> int:
+        return len(self._queues)
+
+    def put_nowait(self, url: str) -> None:
+        host = self._host_of(url)
+        queue = self._queues.get(host)
+        seq = next(self._seq)
+        if queue is None:
+            queue = self._queues[host] = deque()
+            heappush(self._ready, (seq, host))
+        queue.append((seq, url))
+        self._size += 1
+        self._unfinished += 1
+        self._finished.clear()
+        self._wakeup.set()
+
+    async def get(self) -> str:
+        while True:
+            url, delay = self._pop_ready()
+            if url is not None:
+                return url
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except TimeoutError:
+                pass
+
+    def get_nowait(self) -> str:
+        url, _ = self._pop_ready()
+        if url is None:
+            raise asyncio.QueueEmpty
+        return url
+
+    def _pop_ready(self) -> tuple[str | None, float | None]:
+        """ Next dispatchable URL, else (None, seconds until the earliest ready time). """
+        now = self._clock()
+        ready, waiting, queues = self._ready, self._waiting, self._queues
+        while waiting and waiting[0][0] <= now:
+            _, host = heappop(waiting)
+            heappush(ready, (queues[host][0][0], host))
+        while ready:
+            _, host = heappop(ready)
+            if self.max_per_host is not None and self._in_flight[host] >= self.max_per_host:
+                self._capped.add(host)
+                continue
+            if self.ready_at is not None:
+                at = self.ready_at(host)
+                if at > now:
+                    heappush(waiting, (at, host))
+                    continue
+            queue = queues[host]
+            _, url = queue.popleft()
+            if queue:
+                heappush(ready, (queue[0][0], host))
+            else:
+                del queues[host]
+            self._in_flight[host] += 1
+            self._size -= 1
+            return url, None
+        return None, (waiting[0][0] - now if waiting else None)
+
+    def task_done(self, url: str) -> None:
+        """ Mark a URL returned by get() as processed (frees its host's slot). """
+        if self._unfinished <= 0:
+            raise ValueError("task_done() called too many times")
+        host = self._host_of(url)
+        self._in_flight[host] -= 1
+        if not self._in_flight[host]:
+            del self._in_flight[host]
+        if host in self._capped:
+            self._capped.discard(host)
+            heappush(self._ready, (self._queues[host][0][0], host))
+            self._wakeup.set()
+        self._unfinished -= 1
+        if not self._unfinished:
+            self._finished.set()
+
+    async def join(self) -> None:
+        await self._finished.wait()
@@ -486,3 +486,76 @@ class TestLevel4Strict:
             "https://b.com",
             "https://b.com/contact",
         }
+
+
+# ============================================================
+# Level 5: Worker-pool crawl_async
+# ============================================================
+
+def synthetic_web(pages: int, hosts: int = 5, links: int = 4, seed: int = 0) -> dict[str, list[str]]:
+    import random
+    rng = random.Random(seed)
+    urls = [f"https://h{i % hosts}.test/p{i}" for i in range(pages)]
+    return {url: [urls[rng.randrange(pages)] for _ in range(links)] + urls[i + 1:i + 2]
+            for i, url in enumerate(urls)}
+
+
+class WebCrawler(Crawler):
+    def __init__(self, web, delays=None, **kwargs):
+        kwargs.setdefault("requests_per_second", 0)
+        super().__init__(**kwargs)
+        self.web = web
+        self.delays = delays or {}
+        self.finished = []
+
+    async def fetch_async(self, url: str) -> list[str]:
+        await asyncio.sleep(self.delays.get(url, 0.001))
+        self.finished.append(url)
+        return self.web.get(url, [])
+
+
+class TestLevel5:
+    @pytest.mark.asyncio
+    async def test_strict_bfs_matches_sequential(self):
+        web = synthetic_web(200)
+        delays = {url: 0.001 * (i % 7) for i, url in enumerate(web)}
+        crawler = WebCrawler(web, delays, max_pages=150, max_concurrent=16, strict_bfs=True)
+        crawler.fetch = lambda url: web.get(url, [])  # crawl() reads the module MOCK_WEB
+        sequential = crawler.crawl("https://h0.test/p0")
+        assert await crawler.crawl_async("https://h0.test/p0") == sequential
+
+    @pytest.mark.asyncio
+    async def test_finds_all_pages_without_duplicates(self):
+        web = synthetic_web(300)
+        crawler = WebCrawler(web, max_pages=1000, max_concurrent=8)
+        result = await crawler.crawl_async("https://h0.test/p0")
+        assert sorted(result) == sorted(web)
+        assert len(crawler.finished) == len(web)
+
+    @pytest.mark.asyncio
+    async def test_max_pages_exact(self):
+        crawler = WebCrawler(synthetic_web(300), max_pages=37, max_concurrent=16)
+        result = await crawler.crawl_async("https://h0.test/p0")
+        assert len(result) == 37
+        assert len(crawler.finished) == 37
+
+    @pytest.mark.asyncio
+    async def test_slow_page_does_not_stall_others(self):
+        web = {"https://s.test": ["https://s.test/slow", "https://s.test/f0"],
+               **{f"https://s.test/f{i}": [f"https://s.test/f{i + 1}"] for i in range(10)}}
+        crawler = WebCrawler(web, {"https://s.test/slow": 0.3}, max_pages=100, max_concurrent=2)
+        result = await crawler.crawl_async("https://s.test")
+        assert len(result) == 13
+        # the whole fast chain completes while the slow page is still in flight
+        assert crawler.finished[-1] == "https://s.test/slow"
+
+    @pytest.mark.asyncio
+    async def test_start_url_domain_filtered(self):
+        crawler = WebCrawler(MOCK_WEB, max_pages=10, allowed_domains=["b.com"])
+        assert await crawler.crawl_async("https://a.com") == []
+
+    @pytest.mark.asyncio
+    async def test_workers_are_cleaned_up(self):
+        crawler = WebCrawler(synthetic_web(50), max_pages=20, max_concurrent=8)
+        await crawler.crawl_async("https://h0.test/p0")
+        assert asyncio.all_tasks() == {asyncio.current_task()}
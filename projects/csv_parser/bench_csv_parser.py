@@ -0,0 +1,281 @@
+"""
+Throughput benchmarks for CSVParser.
+Run: python bench_csv_parser.py
+"""
+
+import csv
+import io
+import os
+import random
+import tempfile
+import time
+from collections.abc import Callable
+
+from csv_parser import CSVParser, CSVWriter, GroupedWindowAggregator, WindowAggregator
+
+
+def quote_free_corpus(rows: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    return [f"user{rng.randrange(10**6)},{rng.choice(['NYC', 'SF', 'LA'])},"
+            f"{rng.random() * 100:.3f},{rng.randrange(10**9)},{rng.random():.6f}"
+            for _ in range(rows)]
+
+
+def quoted_corpus(rows: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    return [f'"user {rng.randrange(10**6)}","{rng.choice(["New York, NY", "SF, CA", "LA"])}",'
+            f'"said ""hi"" {rng.randrange(100)} times",{rng.random() * 100:.3f},'
+            f'"{rng.randrange(10**9)}"'
+            for _ in range(rows)]
+
+
+def megabytes(lines: list[str]) -> float:
+    return sum(len(line) + 1 for line in lines) / 1e6
+
+
+def throughput(fn: Callable[[str], object], lines: list[str]) -> float:
+    """MB/s of fn applied to every line"""
+    start = time.perf_counter()
+    for line in lines:
+        fn(line)
+    return megabytes(lines) / (time.perf_counter() - start)
+
+
+def bench_parse_row(rows: int = 100_000) -> None:
+    corpora = {"quote-free": quote_free_corpus(rows), "quoted-heavy": quoted_corpus(rows)}
+    state_machine, fast = CSVParser(), CSVParser(fast=True)
+    print(f"{'corpus':<14}{'mode':<16}{'split MB/s':>12}{'parse_row MB/s':>16}")
+    for name, lines in corpora.items():
+        for mode, parser in (("state machine", state_machine), ("fast", fast)):
+            split = parser._split_fast if parser.fast else parser._split
+            print(f"{name:<14}{mode:<16}{throughput(split, lines):>12.1f}"
+                  f"{throughput(parser.parse_row, lines):>16.1f}")
+
+
+def numeric_corpus(rows: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    return [",".join([str(rng.randrange(10**6)), str(rng.randrange(10**9))]
+                     + [f"{rng.random() * 1000:.4f}" for _ in range(6)] + ["tag"])
+            for _ in range(rows)]
+
+
+def bench_schema(rows: int = 100_000) -> None:
+    """Per-cell int/float/str attempts vs per-column converters on a numeric-heavy corpus"""
+    lines = numeric_corpus(rows)
+    parsers = {
+        "no schema (_value)": CSVParser(fast=True),
+        "explicit schema": CSVParser(fast=True, schema=[int, int] + [float] * 6 + [None]),
+        "inferred schema": CSVParser(fast=True, schema="infer"),
+        "skip 6 float cols": CSVParser(fast=True, schema=[int, int] + [None] * 7),
+    }
+    print(f"{'numeric-heavy':<24}{'MB/s':>8}{'speedup':>9}")
+    baseline = None
+    for name, parser in parsers.items():
+        start = time.perf_counter()
+        for _ in parser.iter(lines):
+            pass
+        mbps = megabytes(lines) / (time.perf_counter() - start)
+        baseline = baseline or mbps
+        print(f"{name:<24}{mbps:>8.1f}{mbps / baseline:>8.1f}x")
+
+
+def wide_corpus(rows: int, columns: int = 80, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    return [",".join([rng.choice(["keep", "drop"])]
+                     + [f"{rng.random() * 1000:.3f}" for _ in range(columns - 1)])
+            for _ in range(rows)]
+
+
+def bench_projection(rows: int = 20_000) -> None:
+    """Full parse + filter in Python vs columns=/where= pushdown, 3 of 80 columns"""
+    lines = wide_corpus(rows)
+    parser = CSVParser(fast=True)
+
+    def full():
+        for row in parser.iter(lines):
+            if row[0] == "keep":
+                _ = [row[0], row[5], row[9]]
+
+    def pushdown():
+        for _ in parser.iter(lines, columns=[0, 5, 9], where={0: "keep"}):
+            pass
+
+    print(f"{'3 of 80 cols, 50% rows':<24}{'MB/s':>8}")
+    for name, fn in (("full parse + filter", full), ("columns + where", pushdown)):
+        start = time.perf_counter()
+        fn()
+        print(f"{name:<24}{megabytes(lines) / (time.perf_counter() - start):>8.1f}")
+
+
+def bench_batches(rows: int = 100_000) -> None:
+    """Rows of boxed objects vs column batches (array.array / NumPy)"""
+    import tracemalloc
+    lines = numeric_corpus(rows)
+    parser = CSVParser(fast=True, schema="infer")
+
+    def row_lists():
+        return list(parser.iter(lines))
+
+    def batches():
+        return list(parser.iter_batches(lines, batch_rows=rows))
+
+    print(f"{'numeric-heavy':<24}{'MB/s':>8}{'result MB':>11}")
+    for name, fn in (("iter() rows", row_lists), ("iter_batches()", batches)):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        tracemalloc.start()
+        result = fn()
+        held = tracemalloc.get_traced_memory()[0] / 1e6
+        tracemalloc.stop()
+        del result
+        print(f"{name:<24}{megabytes(lines) / elapsed:>8.1f}{held:>11.1f}")
+
+
+def bench_file(rows: int = 200_000) -> None:
+    """Text-mode line iteration vs chunked binary reading of the same file"""
+    parser = CSVParser(fast=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.csv")
+        with open(path, "w") as fp:
+            fp.write("\n".join(quoted_corpus(rows)) + "\n")
+        size = os.path.getsize(path) / 1e6
+
+        def text_lines():
+            with open(path) as fp:
+                for _ in parser.iter(fp):
+                    pass
+
+        def chunked():
+            for _ in parser.iter_from_file(path):
+                pass
+
+        print(f"{'file read':<30}{'MB/s':>8}")
+        for name, fn in (("text-mode lines + iter", text_lines), ("binary chunks (1 MB)", chunked)):
+            start = time.perf_counter()
+            fn()
+            print(f"{name:<30}{size / (time.perf_counter() - start):>8.1f}")
+
+
+def bench_parallel(rows: int = 400_000) -> None:
+    """iter_from_file vs iter_parallel; speedup is bounded by os.cpu_count()"""
+    parser = CSVParser(fast=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.csv")
+        with open(path, "w") as fp:
+            fp.write("\n".join(quote_free_corpus(rows)) + "\n")
+        size = os.path.getsize(path) / 1e6
+
+        print(f"{'parallel (' + str(os.cpu_count()) + ' cpus)':<30}{'MB/s':>8}")
+        runs = (("iter_from_file", lambda: parser.iter_from_file(path)),
+                ("iter_parallel ordered", lambda: parser.iter_parallel(path, range_bytes=1 << 20)),
+                ("iter_parallel unordered",
+                 lambda: parser.iter_parallel(path, ordered=False, range_bytes=1 << 20)))
+        for name, rows_iter in runs:
+            start = time.perf_counter()
+            for _ in rows_iter():
+                pass
+            print(f"{name:<30}{size / (time.perf_counter() - start):>8.1f}")
+
+
+def sensor_columns(rows: int, sensors: int = 100, seed: int = 0) -> tuple[list, list, list]:
+    """(keys, ts, vals) columns, ts increasing with up to 2s of out-of-order jitter"""
+    rng = random.Random(seed)
+    keys = [f"sensor{rng.randrange(sensors)}" for _ in range(rows)]
+    ts = [i * 0.01 + rng.random() * 2 for i in range(rows)]
+    vals = [rng.random() * 100 for _ in range(rows)]
+    return keys, ts, vals
+
+
+def bench_windows(rows: int = 500_000) -> None:
+    """rows/sec of WindowAggregator vs GroupedWindowAggregator (100 keys) per window type"""
+    keys, ts, vals = sensor_columns(rows)
+    row_list = [[k, t, v] for k, t, v in zip(keys, ts, vals)]
+
+    def single():
+        agg = WindowAggregator(window_size=60, ts_index=1, val_index=2)
+        for row in row_list:
+            agg.add_row(row)
+
+    def grouped(batch: int, **kwargs):
+        def run():
+            agg = GroupedWindowAggregator(allowed_lateness=2, **kwargs)
+            for i in range(0, rows, batch):
+                agg.add_batch(ts[i:i + batch], vals[i:i + batch], keys[i:i + batch],
+                              ts[i:i + batch])
+            agg.flush()
+        return run
+
+    def grouped_rows():
+        agg = GroupedWindowAggregator(window_size=60, ts_index=1, val_index=2, key_index=0,
+                                      allowed_lateness=2)
+        for row in row_list:
+            agg.add_row(row)
+
+    runs = (("WindowAggregator (1 key)", single),
+            ("tumbling add_row", grouped_rows),
+            ("tumbling add_batch", grouped(65536, window_size=60)),
+            ("sliding 60/10 add_batch", grouped(65536, window_size=60, slide=10)),
+            ("session gap=1 add_batch", grouped(65536, session_gap=1)),
+            ("tumbling + p50/95/99, distinct",
+             grouped(65536, window_size=60, quantiles=(0.5, 0.95, 0.99), distinct_index=0)))
+    print(f"{'windows, 100 keys':<32}{'rows/sec':>12}")
+    for name, fn in runs:
+        start = time.perf_counter()
+        fn()
+        print(f"{name:<32}{rows / (time.perf_counter() - start):>12,.0f}")
+
+
+def bench_writer(rows: int = 200_000) -> None:
+    """MB/s of output: hand-rolled join (no quoting) vs stdlib csv.writer vs CSVWriter"""
+    parser = CSVParser(fast=True)
+    corpora = {"quote-free": quote_free_corpus(rows), "quoted-heavy": quoted_corpus(rows)}
+
+    def naive(data):
+        out = io.StringIO()
+        out.write("".join(",".join(map(str, row)) + "\n" for row in data))
+        return out
+
+    def stdlib(data):
+        out = io.StringIO()
+        csv.writer(out, lineterminator="\n").writerows(data)
+        return out
+
+    def writer(data):
+        out = io.StringIO()
+        with CSVWriter(out) as w:
+            w.writerows(data)
+        return out
+
+    print(f"{'write':<14}{'method':<18}{'MB/s':>8}{'round-trips':>13}")
+    for name, lines in corpora.items():
+        data = list(parser.iter(lines))
+        for method, fn in (("','.join", naive), ("csv.writer", stdlib), ("CSVWriter", writer)):
+            start = time.perf_counter()
+            out = fn(data)
+            elapsed = time.perf_counter() - start
+            text = out.getvalue()
+            ok = list(parser.iter(io.StringIO(text))) == data
+            print(f"{name:<14}{method:<18}{len(text) / 1e6 / elapsed:>8.1f}{str(ok):>13}")
+
+
+def main() -> None:
+    bench_parse_row()
+    print()
+    bench_schema()
+    print()
+    bench_projection()
+    print()
+    bench_batches()
+    print()
+    bench_file()
+    print()
+    bench_parallel()
+    print()
+    bench_windows()
+    print()
+    bench_writer()
+
+
+if __name__ == "__main__":
+    main()
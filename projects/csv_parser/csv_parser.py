@@ -1,10 +1,35 @@
+"""
+CSV parsing, writing and streaming window aggregation.
+"""
+
+import argparse
+import codecs
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+from array import array
 from enum import Enum
-from typing import Iterator, Iterable
+from heapq import heappop, heappush
+from collections.abc import Callable, Sequence
+from itertools import chain, islice, repeat
+from typing import Iterator, Iterable, TextIO
+
+from sketches import HyperLogLog, KLLSketch
+
+try:
+    import numpy as np
+except ImportError:  # optional: iter_batches falls back to array.array columns
+    np = None
 
 # ============================================================
 # Level 1: CSV Parser State Machine
 # ============================================================
 
+Where = dict[int, Callable[[str], bool] | str]  # column -> predicate on raw text (or equal-to string)
+
 class States(Enum):
     START = "START"
     QUOTE = "QUOTE"
@@ -13,9 +38,20 @@ class States(Enum):
 
 
 class CSVParser:
-    def __init__(self, delimiter=',', quote='"'):
+    def __init__(self, delimiter=',', quote='"', fast: bool = False,
+                 schema: Sequence[Callable[[str], object] | None] | str | None = None,
+                 infer_rows: int = 100):
         self.delimiter = delimiter
         self.quote = quote
+        # schema: one converter per column (None keeps the raw string), or "infer" to
+        # pick int/float/str per column from the first infer_rows rows streamed.
+        # Without a schema every cell goes through _value's int -> float -> str attempts.
+        self.schema = schema
+        self.infer_rows = infer_rows
+        self._converters = None if schema is None or schema == "infer" else self._compile(schema)
+        # fast: str.split / str.find based splitter, same output as the state machine.
+        # Only single-char delimiter/quote can be matched by find().
+        self.fast = fast and len(delimiter) == 1 and len(quote) == 1
         self.state_transition = {
             States.START: {
                 delimiter: States.START,
@@ -50,6 +86,57 @@ class CSVParser:
 
     def parse_row(self, row: str) -> list:
         """ Parse a single CSV row into fields. No newline inside cells. """
+        return self._convert(self._split_row(row))
+
+    @staticmethod
+    def _compile(schema: Sequence[Callable[[str], object] | None]) -> list[Callable[[str], object]]:
+        # str(s) returns s itself, so "no conversion" costs one call and no copy
+        return [str if convert is None else convert for convert in schema]
+
+    def infer_schema(self, rows: Iterable[list[str]]) -> list[type | None]:
+        """ Column types from raw (unconverted) rows: int or float if every
+        non-empty sample cell parses as one, else None (keep the string). """
+        candidates: list[set] = []
+        for cells in rows:
+            for i, cell in enumerate(cells):
+                if i == len(candidates):
+                    candidates.append({int, float})
+                if cell == "" or not candidates[i]:
+                    continue
+                for kind in list(candidates[i]):
+                    try:
+                        kind(cell)
+                    except ValueError:
+                        candidates[i].discard(kind)
+        return [int if int in kinds else float if float in kinds else None for kinds in candidates]
+
+    def _convert(self, cells: list[str]) -> list:
+        converters = self._converters
+        if converters is None:
+            return [self._value(cell) for cell in cells]
+        if len(cells) == len(converters):
+            # try is free in 3.11+ unless it raises; one schema violation sends the
+            # whole row down the per-cell path below
+            try:
+                return [convert(cell) for convert, cell in zip(converters, cells)]
+            except ValueError:
+                pass
+        return [self._convert_cell(i, cell) for i, cell in enumerate(cells)]
+
+    def _convert_cell(self, i: int, cell: str) -> object:
+        if self._converters is None or i >= len(self._converters):
+            return self._value(cell)
+        try:
+            return self._converters[i](cell)
+        except ValueError:
+            return self._value(cell)
+
+    def _split_row(self, row: str, limit: int | None = None) -> list[str]:
+        """ Raw cells; with a limit, scanning stops once `limit` cells are complete. """
+        return self._split_fast(row, limit) if self.fast else self._split(row, limit)
+
+    def _split(self, row: str, limit: int | None = None) -> list[str]:
+        """ State machine: one transition per character. """
         state = States.START
         row_list = []
         cell = []
@@ -65,65 +152,807 @@ class CSVParser:
 
             # if state is States.START, emit cell content
             if state == States.START:
-                row_list.append(self._value(''.join(cell)))
+                row_list.append(''.join(cell))
                 cell = []
+                if len(row_list) == limit:
+                    return row_list
 
-        row_list.append(self._value(''.join(cell)))
+        row_list.append(''.join(cell))
         return row_list
 
+    def _split_fast(self, row: str, limit: int | None = None) -> list[str]:
+        """ Same transitions as _split, but jumps between delimiters/quotes with str.find. """
+        delimiter, quote = self.delimiter, self.quote
+        if quote not in row:
+            # maxsplit leaves the unscanned remainder as one extra trailing cell
+            return row.split(delimiter) if limit is None else row.split(delimiter, limit)
+
+        fields = []
+        i, n = 0, len(row)
+        while len(fields) != limit:
+            if i < n and row[i] == quote:
+                # START --quote--> QUOTE
+                parts = []
+                i += 1
+                while True:
+                    # QUOTE: everything up to the next quote is content
+                    j = row.find(quote, i)
+                    if j == -1:
+                        parts.append(row[i:])
+                        fields.append(''.join(parts))
+                        return fields
+                    parts.append(row[i:j])
+                    i = j + 1
+                    # QUOTE_IN_QUOTE: other chars are kept, quote escapes, delimiter ends the field
+                    while i < n and row[i] != quote and row[i] != delimiter:
+                        parts.append(row[i])
+                        i += 1
+                    if i == n:
+                        fields.append(''.join(parts))
+                        return fields
+                    if row[i] == quote:
+                        parts.append(quote)
+                        i += 1
+                        continue
+                    fields.append(''.join(parts))
+                    i += 1
+                    break
+            else:
+                # START/UNQUOTE: quotes are literal until the next delimiter
+                j = row.find(delimiter, i)
+                if j == -1:
+                    fields.append(row[i:])
+                    return fields
+                fields.append(row[i:j])
+                i = j + 1
+        return fields
 
     def parse(self, text: list[str]) -> list[list]:
         """ Parse all rows (load all into memory). """
-        res = []
-        for row in text:
-            res.append(self.parse_row(row.strip()))
-        return res
+        return list(self.iter(text))
+
+    def iter(self, source: Iterable[str], columns: Sequence[int] | None = None,
+             where: Where | None = None) -> Iterator[list]:
+        """ Streaming: yield one parsed row at a time, O(1) memory.
+        A quoted field may span lines; they are joined back with "\n".
+
+        columns: yield only these fields (in this order); scanning a row stops
+        after the last column needed by `columns` or `where`.
+        where: {column: predicate} evaluated on the raw text before any conversion;
+        a string matches by equality. Rows failing any predicate are skipped. """
+        yield from self._parse_records(self._records(source), columns, where)
+
+    def iter_from_file(self, filepath: str, chunk_size: int = 1 << 20, encoding: str = "utf-8",
+                       columns: Sequence[int] | None = None, where: Where | None = None) -> Iterator[list]:
+        """ Read the file in binary chunks of chunk_size bytes; memory is bounded by
+        chunk_size plus the longest record, not by the file size. """
+        with open(filepath, "rb") as fp:
+            yield from self.iter_chunks(iter(lambda: fp.read(chunk_size), b""), encoding, columns, where)
+
+    def iter_chunks(self, chunks: Iterable[bytes], encoding: str = "utf-8",
+                    columns: Sequence[int] | None = None, where: Where | None = None) -> Iterator[list]:
+        """ Stream rows from raw byte chunks split at arbitrary positions. """
+        yield from self._parse_records(self._records(self._lines(chunks, encoding)), columns, where)
+
+    def _parse_records(self, records: Iterator[str], columns: Sequence[int] | None,
+                       where: Where | None) -> Iterator[list]:
+        records = self._schema_ready(records)
+        if columns is None and where is None:
+            for record in records:
+                yield self.parse_row(record)
+            return
+
+        predicates = [(i, test.__eq__ if isinstance(test, str) else test)
+                      for i, test in (where or {}).items()]
+        limit = None if columns is None else max([*columns, *(where or {})]) + 1
+        for record in records:
+            cells = self._split_row(record, limit)
+            if predicates and not all(test(cells[i]) for i, test in predicates):
+                continue
+            if columns is None:
+                yield self._convert(cells)
+            else:
+                yield [self._convert_cell(i, cells[i]) for i in columns]
+
+    def _schema_ready(self, records: Iterator[str]) -> Iterator[str]:
+        """ Pass records through, inferring the schema from the head first if asked to. """
+        if self.schema == "infer" and self._converters is None:
+            head = list(islice(records, self.infer_rows))
+            self._converters = self._compile(self.infer_schema(self._split_row(r) for r in head))
+            yield from head
+        yield from records
+
+    def iter_batches(self, source: Iterable[str], batch_rows: int = 65536,
+                     columns: Sequence[int] | None = None, where: Where | None = None,
+                     use_numpy: bool | None = None) -> Iterator[list]:
+        """ Column-oriented batches of up to batch_rows rows: one entry per column
+        (in `columns` order), int columns as array('q'), float columns as array('d')
+        (NumPy int64/float64 arrays when NumPy is available, or forced with use_numpy),
+        everything else as a list. Column types come from the schema, or are inferred
+        from the first infer_rows rows without changing the parser's own schema.
+        A batch where a numeric column fails to convert returns that column as a
+        list of default-coerced values. """
+        yield from self._batches(self._records(source), batch_rows, columns, where, use_numpy)
+
+    def iter_batches_from_file(self, filepath: str, batch_rows: int = 65536,
+                               columns: Sequence[int] | None = None, where: Where | None = None,
+                               use_numpy: bool | None = None, chunk_size: int = 1 << 20,
+                               encoding: str = "utf-8") -> Iterator[list]:
+        with open(filepath, "rb") as fp:
+            chunks = iter(lambda: fp.read(chunk_size), b"")
+            yield from self._batches(self._records(self._lines(chunks, encoding)),
+                                     batch_rows, columns, where, use_numpy)
 
-    def iter(self, source: Iterable[str]) -> Iterator[list]:
-        """ Streaming: yield one parsed row at a time, O(1) memory. """
-        for row in source:
-            yield self.parse_row(row.strip())
+    def _batches(self, records: Iterator[str], batch_rows: int, columns: Sequence[int] | None,
+                 where: Where | None, use_numpy: bool | None) -> Iterator[list]:
+        if use_numpy is None:
+            use_numpy = np is not None
+        elif use_numpy and np is None:
+            raise ImportError("use_numpy=True requires numpy")
+
+        records = self._schema_ready(records)
+        converters = self._converters
+        if converters is None:
+            head = list(islice(records, self.infer_rows))
+            converters = self._compile(self.infer_schema(self._split_row(r) for r in head))
+            records = chain(head, records)
+        if columns is None:
+            columns = range(len(converters))
+
+        predicates = [(i, test.__eq__ if isinstance(test, str) else test)
+                      for i, test in (where or {}).items()]
+        limit = max([*columns, *(where or {})], default=-1) + 1
+        column_converters = [converters[i] if i < len(converters) else self._value for i in columns]
+        while True:
+            rows = []
+            for record in islice(records, batch_rows):
+                cells = self._split_row(record, limit)
+                if predicates and not all(test(cells[i]) for i, test in predicates):
+                    continue
+                rows.append([cells[i] for i in columns])
+            if not rows:
+                return
+            yield [self._column(convert, cells, use_numpy)
+                   for convert, cells in zip(column_converters, zip(*rows))]
+
+    def _column(self, convert: Callable[[str], object], cells: tuple[str, ...], use_numpy: bool):
+        typecode = "q" if convert is int else "d" if convert is float else None
+        if typecode is None:
+            return list(map(convert, cells))
+        try:
+            # The boxed int/float per cell is released as soon as it is packed
+            column = array(typecode, map(convert, cells))
+        except (ValueError, OverflowError):
+            return [self._value(cell) for cell in cells]
+        if use_numpy:
+            return np.frombuffer(column, dtype=np.int64 if typecode == "q" else np.float64)
+        return column
+
+    def iter_parallel(self, filepath: str, workers: int | None = None, ordered: bool = True,
+                      range_bytes: int = 8 << 20, encoding: str = "utf-8") -> Iterator[list]:
+        """ Parse byte ranges of the file in worker processes.
+
+        Ranges are moved forward to the next record boundary: the first newline
+        preceded by an even number of quote bytes since the start of the file.
+        Quote counts per range are gathered in parallel first, so only the short
+        scan to each boundary is sequential. This assumes RFC 4180 quoting (quote
+        characters only appear inside quoted fields); a stray quote in an unquoted
+        field can shift a boundary.
+
+        ordered=False yields each range's rows as soon as it is parsed.
+        """
+        quote = self.quote.encode(encoding)
+        if len(quote) != 1:
+            raise ValueError("parallel parsing needs a single-byte quote character")
+        size = os.path.getsize(filepath)
+        if size <= range_bytes:
+            yield from self.iter_from_file(filepath, encoding=encoding)
+            return
+
+        if self.schema == "infer" and self._converters is None:
+            # Infer once here so every worker converts with the same column types
+            with open(filepath, "rb") as fp:
+                head = fp.read(range_bytes)
+            head = head[:head.rfind(b"\n") + 1] or head  # whole lines only
+            for _ in self._schema_ready(self._records(self._lines([head], encoding))):
+                break
+
+        starts = list(range(0, size, range_bytes))
+        with multiprocessing.Pool(workers) as pool:
+            counts = pool.map(_count_bytes, [(filepath, start, min(start + range_bytes, size), quote)
+                                             for start in starts])
+            boundaries = _record_boundaries(filepath, starts, counts, quote) + [size]
+            tasks = [(self, filepath, begin, end, encoding)
+                     for begin, end in zip(boundaries, boundaries[1:]) if begin < end]
+            results = pool.imap(_parse_range, tasks) if ordered else pool.imap_unordered(_parse_range, tasks)
+            for rows in results:
+                yield from rows
+
+    @staticmethod
+    def _lines(chunks: Iterable[bytes], encoding: str) -> Iterator[str]:
+        # Incremental decoder keeps multi-byte characters split across chunks intact
+        decoder = codecs.getincrementaldecoder(encoding)()
+        tail = ""
+        for chunk in chunks:
+            lines = (tail + decoder.decode(chunk)).split("\n")
+            tail = lines.pop()
+            yield from lines
+        tail += decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+
+    def _records(self, lines: Iterable[str]) -> Iterator[str]:
+        """ Join physical lines into records: a line ending inside a quoted field continues. """
+        quote = self.quote
+        parts = []
+        state = States.START
+        for line in lines:
+            line = line.rstrip("\r\n")
+            if parts or quote in line:
+                state = self._end_state(line, state if parts else States.START)
+                parts.append(line)
+                if state == States.QUOTE:
+                    continue
+                line = "\n".join(parts)
+                parts = []
+            yield line
+        if parts:
+            # Unterminated quote at EOF: emit what we have, like the state machine does
+            yield "\n".join(parts)
+
+    def _end_state(self, line: str, state: States) -> States:
+        """ State after feeding `line` to the state machine, skipping ahead with str.find. """
+        delimiter, quote = self.delimiter, self.quote
+        if len(delimiter) != 1 or len(quote) != 1:
+            return States.START  # the per-char state machine never matches these
+        i, n = 0, len(line)
+        while i < n:
+            if state == States.QUOTE:
+                j = line.find(quote, i)
+                if j == -1:
+                    return States.QUOTE
+                i = j + 1
+                state = States.QUOTE_IN_QUOTE
+            elif state == States.UNQUOTE:
+                j = line.find(delimiter, i)
+                if j == -1:
+                    return States.UNQUOTE
+                i = j + 1
+                state = States.START
+            else:
+                char = line[i]
+                i += 1
+                if char == quote:
+                    state = States.QUOTE
+                elif char == delimiter:
+                    state = States.START
+                elif state == States.START:
+                    state = States.UNQUOTE
+        return state
+
+
+def _count_bytes(task: tuple[str, int, int, bytes]) -> int:
+    filepath, start, end, needle = task
+    count = 0
+    with open(filepath, "rb") as fp:
+        fp.seek(start)
+        while start < end:
+            block = fp.read(min(1 << 20, end - start))
+            count += block.count(needle)
+            start += len(block)
+    return count
+
+
+def _record_boundaries(filepath: str, starts: list[int], counts: list[int], quote: bytes) -> list[int]:
+    """ First offset at or after each range start that begins a record. """
+    boundaries = [0]
+    quotes_before = 0  # quotes in [0, start)
+    with open(filepath, "rb") as fp:
+        for start, count in zip(starts[1:], counts):
+            quotes_before += count
+            pos = max(start, boundaries[-1])
+            parity = quotes_before
+            if pos > start:
+                fp.seek(start)
+                parity += fp.read(pos - start).count(quote)
+            fp.seek(pos)
+            while True:
+                block = fp.read(1 << 16)
+                if not block:
+                    boundaries.append(pos)  # EOF, empty range
+                    break
+                scanned, nl = 0, block.find(b"\n")
+                while nl != -1:
+                    parity += block.count(quote, scanned, nl)
+                    scanned = nl
+                    if parity % 2 == 0:
+                        break
+                    nl = block.find(b"\n", nl + 1)
+                if nl != -1:
+                    boundaries.append(pos + nl + 1)
+                    break
+                parity += block.count(quote, scanned)
+                pos += len(block)
+    return boundaries
+
+
+def _parse_range(task: tuple["CSVParser", str, int, int, str]) -> list[list]:
+    parser, filepath, start, end, encoding = task
+    with open(filepath, "rb") as fp:
+        fp.seek(start)
+        data = fp.read(end - start)
+    return list(parser.iter_chunks([data], encoding))
+
+
+class CSVWriter:
+    """ Buffered CSV writer, the inverse of CSVParser with the same delimiter/quote.
+
+    A cell is quoted only if it contains the delimiter, the quote, "\r" or "\n";
+    embedded quotes are doubled and None is written as an empty cell. Strings
+    read back exactly with CSVParser (given a str schema, since without one
+    numeric-looking text converts to int/float either way), except that the
+    parser strips "\r" before each line break of a multi-line field.
+    """
+    def __init__(self, target: str | os.PathLike | TextIO, delimiter: str = ',', quote: str = '"',
+                 lineterminator: str = "\n", buffer_rows: int = 4096, encoding: str = "utf-8") -> None:
+        if isinstance(target, (str, os.PathLike)):
+            self._fp, self._owns = open(target, "w", encoding=encoding, newline=""), True
+        else:
+            self._fp, self._owns = target, False
+        self.delimiter = delimiter
+        self.quote = quote
+        self.lineterminator = lineterminator
+        self.buffer_rows = buffer_rows
+        self._escaped_quote = quote * 2
+        self._needs_quote = re.compile("|".join(re.escape(s) for s in (delimiter, quote, "\r", "\n")))
+        # whole-line check: if the joined line has no quote/CR/LF and exactly
+        # len(cells) - 1 delimiters, no cell needs quoting
+        self._special = re.compile("|".join(re.escape(s) for s in (quote, "\r", "\n")))
+        self._buffer: list[str] = []
 
-    def iter_from_file(self, filepath: str) -> Iterator[list]:
-        with open(filepath, "r") as fp:
-            yield from self.iter(fp)
+    @classmethod
+    def from_parser(cls, target: str | os.PathLike | TextIO, parser: CSVParser, **kwargs) -> "CSVWriter":
+        return cls(target, delimiter=parser.delimiter, quote=parser.quote, **kwargs)
+
+    def format_row(self, row: Sequence) -> str:
+        """ One record without the line terminator. """
+        cells = [c if c.__class__ is str else "" if c is None else str(c) for c in row]
+        d = self.delimiter
+        line = d.join(cells)
+        if line.count(d) == len(cells) - 1 and not self._special.search(line):
+            return line
+        q, qq, needs_quote = self.quote, self._escaped_quote, self._needs_quote.search
+        return d.join([q + c.replace(q, qq) + q if needs_quote(c) else c for c in cells])
+
+    def writerow(self, row: Sequence) -> None:
+        self._buffer.append(self.format_row(row))
+        if len(self._buffer) >= self.buffer_rows:
+            self._drain()
+
+    def writerows(self, rows: Iterable[Sequence]) -> None:
+        buffer, format_row, limit = self._buffer, self.format_row, self.buffer_rows
+        for row in rows:
+            buffer.append(format_row(row))
+            if len(buffer) >= limit:
+                self._drain()
+                buffer = self._buffer
+
+    def _drain(self) -> None:
+        """ One write() per batch of buffered rows. """
+        if self._buffer:
+            terminator = self.lineterminator
+            self._fp.write(terminator.join(self._buffer) + terminator)
+            self._buffer = []
+
+    def flush(self) -> None:
+        self._drain()
+        self._fp.flush()
+
+    def close(self) -> None:
+        self.flush()
+        if self._owns:
+            self._fp.close()
+
+    def __enter__(self) -> "CSVWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
 
 
 class WindowAggregator:
-    def __init__(self, window_size: float, ts_index: int, val_index: int) -> None:
+    def __init__(self, window_size: float, ts_index: int, val_index: int,
+                 quantiles: Sequence[float] = (), distinct_index: int | None = None) -> None:
         self.window_size = window_size
         self.ts_index = ts_index
         self.val_index = val_index
-        self.aggregate_result = {}
+        self.quantiles = tuple(quantiles)
+        self.distinct_index = distinct_index
+        self._count = 0
+        self._sum = self._min = self._max = self._window_start = None
+        self._kll = self._hll = None
+
+    @property
+    def aggregate_result(self) -> dict:
+        if not self._count:
+            return {}
+        result = {"count": self._count, "sum": self._sum, "avg": self._sum / self._count,
+                  "max": self._max, "min": self._min, "window_start": self._window_start,
+                  "window_end": self._window_start + self.window_size}
+        _sketch_fields(result, self.quantiles, self._kll, self._hll)
+        return result
 
     def _aggregate(self, row: list) -> None:
         ts, val = row[self.ts_index], row[self.val_index]
-        self.aggregate_result["count"] = self.aggregate_result.get("count", 0) + 1
-        self.aggregate_result["sum"] = self.aggregate_result.get("sum", 0) + val
-        self.aggregate_result["avg"] = self.aggregate_result["sum"] / self.aggregate_result["count"]
-        self.aggregate_result["max"] = max(self.aggregate_result.get("max", float('-inf')), val)
-        self.aggregate_result["min"] = min(self.aggregate_result.get("min", float('inf')), val)
-        self.aggregate_result["window_start"] = ts // self.window_size * self.window_size
-        self.aggregate_result["window_end"] = self.aggregate_result["window_start"] + self.window_size
-    
+        if self._count:
+            self._count += 1
+            self._sum += val
+            if val > self._max:
+                self._max = val
+            elif val < self._min:
+                self._min = val
+        else:
+            self._count, self._sum, self._min, self._max = 1, val, val, val
+            if self.quantiles:
+                self._kll = KLLSketch()
+            if self.distinct_index is not None:
+                self._hll = HyperLogLog()
+        self._window_start = ts // self.window_size * self.window_size
+        if self._kll is not None:
+            self._kll.update(val)
+        if self._hll is not None:
+            self._hll.update(row[self.distinct_index])
+
     def add_row(self, row: list) -> dict | None:
         """ returns result when window completes """
         completed = None
-        if row[self.ts_index] >= self.aggregate_result.get("window_end", float('inf')):
+        if self._count and row[self.ts_index] >= self._window_start + self.window_size:
             completed = self.flush()
-        
+
         self._aggregate(row)
 
         return completed
 
     def flush(self) -> dict | None:
-        res = self.aggregate_result.copy()
-        self.aggregate_result = {}
-        return res if res != {} else None
-
-parser = CSVParser()
-agg = WindowAggregator(window_size=10, ts_index=3, val_index=2)
-for row in parser.iter_from_file('example.csv'):
-    result = agg.add_row(row)
-    if result:
-        print(result)
\ No newline at end of file
+        res = self.aggregate_result
+        self._count = 0
+        return res or None
+
+
+class GroupedWindowAggregator:
+    """ Per-key tumbling, hopping/sliding (slide=) or session (session_gap=) windows.
+
+    Event time drives a watermark of max(ts) - allowed_lateness. A window is
+    emitted once the watermark passes its end; rows that only fall into
+    already-closed windows are dropped and counted in late_rows. Aggregates
+    of open (key, window) pairs live in parallel arrays indexed by slot.
+
+    quantiles= adds approximate "p50"-style fields (KLL) and distinct_index=
+    a "distinct" count of that column (HyperLogLog); emit_sketches=True also
+    returns the sketches so results of parallel partitions can be merged.
+    """
+    def __init__(self, window_size: float | None = None, ts_index: int = 0, val_index: int = 1,
+                 key_index: int | None = None, slide: float | None = None,
+                 session_gap: float | None = None, allowed_lateness: float = 0.0,
+                 quantiles: Sequence[float] = (), distinct_index: int | None = None,
+                 emit_sketches: bool = False) -> None:
+        if session_gap is None and not window_size:
+            raise ValueError("window_size or session_gap is required")
+        if session_gap is not None and session_gap <= 0 or slide is not None and slide <= 0:
+            raise ValueError("slide and session_gap must be positive")
+        self.window_size = window_size
+        self.slide = slide or window_size
+        self.session_gap = session_gap
+        self.ts_index = ts_index
+        self.val_index = val_index
+        self.key_index = key_index
+        self.allowed_lateness = allowed_lateness
+        self.quantiles = tuple(quantiles)
+        self.distinct_index = distinct_index
+        self.emit_sketches = emit_sketches
+        self.watermark = float("-inf")
+        self.late_rows = 0
+        self._max_ts = float("-inf")
+        # slot -> aggregate; freed slots are reused
+        self._count = array("q")
+        self._sum = array("d")
+        self._min = array("d")
+        self._max = array("d")
+        self._first = array("d")  # session start
+        self._last = array("d")  # session last event
+        self._free: list[int] = []
+        self._kll: dict[int, KLLSketch] = {}
+        self._hll: dict[int, HyperLogLog] = {}
+        # fixed windows: window index (start = index * slide) -> key -> slot
+        self._windows: dict[int, dict[object, int]] = {}
+        self._pending: list[int] = []  # heap of open window indexes
+        # sessions: key -> slot, heap of (close time, seq, key, slot), checked lazily
+        self._sessions: dict[object, int] = {}
+        self._closing: list[tuple[float, int, object, int]] = []
+        self._seq = 0
+
+    def add_row(self, row: list) -> list[dict]:
+        """ returns the windows this row's timestamp closed """
+        key = None if self.key_index is None else row[self.key_index]
+        items = None if self.distinct_index is None else [row[self.distinct_index]]
+        return self.add_batch([row[self.ts_index]], [row[self.val_index]], [key], items)
+
+    def add_batch(self, ts: Sequence[float], vals: Sequence[float],
+                  keys: Sequence | None = None, items: Sequence | None = None) -> list[dict]:
+        """ Columnar update, e.g. from iter_batches(); returns windows closed by the batch.
+
+        items is the column counted by the distinct aggregate.
+        """
+        ts, vals = _as_list(ts), _as_list(vals)
+        keys = repeat(None) if keys is None else _as_list(keys)
+        items = repeat(None) if items is None else _as_list(items)
+        if self.session_gap is not None:
+            out = self._add_sessions(ts, vals, keys, items)
+            self._close_sessions(out)
+        else:
+            self._add_windows(ts, vals, keys, items)
+            out = []
+            self._close_windows(out)
+        return out
+
+    def flush(self) -> list[dict]:
+        """ Emit every open window, oldest end first. """
+        out = []
+        saved, self.watermark = self.watermark, float("inf")
+        if self.session_gap is None:
+            self._close_windows(out)
+        else:
+            self._close_sessions(out)
+        self.watermark = saved
+        return out
+
+    def _new_slot(self, val: float, ts: float) -> int:
+        if self._free:
+            slot = self._free.pop()
+            self._count[slot] = 1
+            self._sum[slot] = self._min[slot] = self._max[slot] = val
+            self._first[slot] = self._last[slot] = ts
+            return slot
+        self._count.append(1)
+        for column in (self._sum, self._min, self._max):
+            column.append(val)
+        self._first.append(ts)
+        self._last.append(ts)
+        return len(self._count) - 1
+
+    def _track(self, slot: int, val: float, item) -> None:
+        if self.quantiles:
+            kll = self._kll.get(slot)
+            if kll is None:
+                kll = self._kll[slot] = KLLSketch()
+            kll.update(val)
+        if self.distinct_index is not None:
+            hll = self._hll.get(slot)
+            if hll is None:
+                hll = self._hll[slot] = HyperLogLog()
+            hll.update(item)
+
+    def _result(self, key, start: float, end: float, slot: int) -> dict:
+        count, total = self._count[slot], self._sum[slot]
+        self._free.append(slot)
+        result = {"key": key, "window_start": start, "window_end": end, "count": count,
+                  "sum": total, "avg": total / count, "min": self._min[slot], "max": self._max[slot]}
+        kll, hll = self._kll.pop(slot, None), self._hll.pop(slot, None)
+        _sketch_fields(result, self.quantiles, kll, hll)
+        if self.emit_sketches:
+            result["quantile_sketch"], result["distinct_sketch"] = kll, hll
+        return result
+
+    def _add_windows(self, ts: list, vals: list, keys: Iterable, items: Iterable) -> None:
+        size, slide, lateness = self.window_size, self.slide, self.allowed_lateness
+        windows, pending, new_slot = self._windows, self._pending, self._new_slot
+        count, total, lo, hi = self._count, self._sum, self._min, self._max
+        track = self._track if self.quantiles or self.distinct_index is not None else None
+        max_ts, watermark = self._max_ts, self.watermark
+        for t, v, key, item in zip(ts, vals, keys, items):
+            if t > max_ts:
+                max_ts = t
+                watermark = max_ts - lateness
+            j = int(t // slide)
+            end = j * slide + size
+            if end <= t:  # hopping gap: no window covers t
+                continue
+            if end <= watermark:
+                self.late_rows += 1
+                continue
+            while end > t and end > watermark:
+                slots = windows.get(j)
+                if slots is None:
+                    slots = windows[j] = {}
+                    heappush(pending, j)
+                slot = slots.get(key)
+                if slot is None:
+                    slots[key] = slot = new_slot(v, t)
+                else:
+                    count[slot] += 1
+                    total[slot] += v
+                    if v < lo[slot]:
+                        lo[slot] = v
+                    if v > hi[slot]:
+                        hi[slot] = v
+                if track:
+                    track(slot, v, item)
+                j -= 1
+                end = j * slide + size
+        self._max_ts, self.watermark = max_ts, watermark
+
+    def _close_windows(self, out: list[dict]) -> None:
+        size, slide, pending = self.window_size, self.slide, self._pending
+        while pending and pending[0] * slide + size <= self.watermark:
+            j = heappop(pending)
+            start = j * slide
+            for key, slot in self._windows.pop(j).items():
+                out.append(self._result(key, start, start + size, slot))
+
+    def _add_sessions(self, ts: list, vals: list, keys: Iterable, items: Iterable) -> list[dict]:
+        """ One open session per key; a row past the gap closes it right away. """
+        gap, lateness, sessions = self.session_gap, self.allowed_lateness, self._sessions
+        count, total, lo, hi = self._count, self._sum, self._min, self._max
+        first, last = self._first, self._last
+        track = self._track if self.quantiles or self.distinct_index is not None else None
+        max_ts, watermark = self._max_ts, self.watermark
+        out = []
+        for t, v, key, item in zip(ts, vals, keys, items):
+            if t > max_ts:
+                max_ts = t
+                watermark = max_ts - lateness
+            slot = sessions.get(key)
+            if slot is not None and last[slot] + gap <= watermark:
+                del sessions[key]
+                out.append(self._result(key, first[slot], last[slot] + gap, slot))
+                slot = None
+            if slot is not None and first[slot] - gap <= t <= last[slot] + gap:
+                count[slot] += 1
+                total[slot] += v
+                if v < lo[slot]:
+                    lo[slot] = v
+                if v > hi[slot]:
+                    hi[slot] = v
+                if t > last[slot]:
+                    last[slot] = t
+                elif t < first[slot]:
+                    first[slot] = t
+                if track:
+                    track(slot, v, item)
+                continue
+            if slot is not None and t > last[slot]:
+                out.append(self._result(key, first[slot], last[slot] + gap, slot))
+            elif slot is not None or t + gap <= watermark:
+                self.late_rows += 1
+                continue
+            sessions[key] = slot = self._new_slot(v, t)
+            if track:
+                track(slot, v, item)
+            self._seq += 1
+            heappush(self._closing, (t + gap, self._seq, key, slot))
+        self._max_ts, self.watermark = max_ts, watermark
+        return out
+
+    def _close_sessions(self, out: list[dict]) -> None:
+        gap, closing, sessions = self.session_gap, self._closing, self._sessions
+        while closing and closing[0][0] <= self.watermark:
+            _, seq, key, slot = heappop(closing)
+            if sessions.get(key) != slot:
+                continue  # already emitted
+            end = self._last[slot] + gap
+            if end > self.watermark:  # extended since pushed
+                heappush(closing, (end, seq, key, slot))
+                continue
+            del sessions[key]
+            out.append(self._result(key, self._first[slot], end, slot))
+
+
+def _sketch_fields(result: dict, quantiles: tuple[float, ...],
+                   kll: KLLSketch | None, hll: HyperLogLog | None) -> None:
+    """ p50/p95/... from the KLL sketch and "distinct" from the HyperLogLog """
+    if kll is not None:
+        for q, value in zip(quantiles, kll.quantiles(quantiles)):
+            result[f"p{q * 100:g}"] = value
+    if hll is not None:
+        result["distinct"] = len(hll)
+
+
+def _as_list(column: Sequence) -> list:
+    """ array.array and NumPy columns iterate faster as lists """
+    return column.tolist() if hasattr(column, "tolist") else column
+
+
+# ============================================================
+# Command line
+# ============================================================
+
+class _Progress:
+    """ Counts bytes of the chunks passing through; reports to a stream at most every `interval` s. """
+    def __init__(self, total: int, stream: TextIO, interval: float = 1.0) -> None:
+        self.total = total
+        self.stream = stream
+        self.interval = interval
+        self.done = 0
+        self.started = self._last = time.perf_counter()
+
+    def track(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        for chunk in chunks:
+            self.done += len(chunk)
+            now = time.perf_counter()
+            if now - self._last >= self.interval:
+                self._last = now
+                self.report()
+            yield chunk
+
+    def report(self) -> None:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        percent = 100.0 * self.done / self.total if self.total else 100.0
+        print(f"{self.done / 1e6:.1f}/{self.total / 1e6:.1f} MB ({percent:.0f}%) "
+              f"{self.done / 1e6 / elapsed:.1f} MB/s", file=self.stream)
+
+
+def _stats(args: argparse.Namespace) -> int:
+    parser = CSVParser(delimiter=args.delimiter, fast=True)
+    if args.key is None:
+        agg = WindowAggregator(args.window, args.ts, args.val)
+
+        def add(row: list) -> list[dict]:
+            result = agg.add_row(row)
+            return [result] if result else []
+
+        def flush() -> list[dict]:
+            result = agg.flush()
+            return [result] if result else []
+    else:
+        grouped = GroupedWindowAggregator(args.window, args.ts, args.val, key_index=args.key)
+        add, flush = grouped.add_row, grouped.flush
+
+    progress = _Progress(os.path.getsize(args.file), sys.stderr, args.progress_interval)
+    needed = max(args.ts, args.val, -1 if args.key is None else args.key)
+    rows = skipped = windows = 0
+    with open(args.file, "rb") as fp:
+        chunks = progress.track(iter(lambda: fp.read(args.chunk_size), b""))
+        for row in parser.iter_chunks(chunks, args.encoding):
+            rows += 1
+            # header lines, short rows and non-numeric cells can't be aggregated
+            if (len(row) <= needed or not isinstance(row[args.ts], (int, float))
+                    or not isinstance(row[args.val], (int, float))):
+                skipped += 1
+                continue
+            for result in add(row):
+                windows += 1
+                print(json.dumps(result))
+    for result in flush():
+        windows += 1
+        print(json.dumps(result))
+    if not args.quiet:
+        progress.report()
+        print(f"{rows} rows ({skipped} skipped), {windows} windows", file=sys.stderr)
+    return 0
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    """ python csv_parser.py stats FILE --window 10 --ts 3 --val 2
+
+    Windows are printed to stdout as JSON lines; progress goes to stderr. """
+    cli = argparse.ArgumentParser(prog="csv_parser", description=__doc__)
+    commands = cli.add_subparsers(dest="command", required=True)
+    stats = commands.add_parser("stats", help="tumbling-window aggregates of a numeric column")
+    stats.add_argument("file")
+    stats.add_argument("--window", type=float, required=True, help="window size, in timestamp units")
+    stats.add_argument("--ts", type=int, required=True, help="timestamp column index")
+    stats.add_argument("--val", type=int, required=True, help="value column index")
+    stats.add_argument("--key", type=int, help="group by this column index")
+    stats.add_argument("--delimiter", default=",")
+    stats.add_argument("--encoding", default="utf-8")
+    stats.add_argument("--chunk-size", type=int, default=1 << 20, help="bytes per read")
+    stats.add_argument("--progress-interval", type=float, default=1.0, help="seconds between reports")
+    stats.add_argument("--quiet", action="store_true", help="no progress or summary on stderr")
+    args = cli.parse_args(argv)
+    if args.quiet:
+        args.progress_interval = float("inf")
+    return _stats(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
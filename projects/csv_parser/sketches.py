@@ -0,0 +1,136 @@
+"""
+Streaming sketches for window aggregates: bounded memory, mergeable across
+partitions/processes (plain attributes, so they pickle).
+
+- KLLSketch: approximate quantiles (Karnin, Lang, Liberty 2016)
+- HyperLogLog: approximate distinct count
+"""
+
+import math
+import random
+from collections.abc import Iterable
+from hashlib import blake2b
+
+
+class KLLSketch:
+    """ Quantile sketch; rank error ~1.65/k, memory O(k) values however many are added. """
+    def __init__(self, k: int = 200, seed: int | None = None) -> None:
+        if k < 8:
+            raise ValueError("k must be at least 8")
+        self.k = k
+        self.n = 0
+        self.compactors: list[list[float]] = []
+        self.size = 0
+        self.max_size = 0
+        self._rng = random.Random(seed)
+        self._grow()
+
+    def _grow(self) -> None:
+        self.compactors.append([])
+        self.max_size = sum(self._capacity(h) for h in range(len(self.compactors)))
+
+    def _capacity(self, height: int) -> int:
+        depth = len(self.compactors) - height - 1
+        return int(math.ceil(self.k * (2 / 3) ** depth)) + 1
+
+    def update(self, value: float) -> None:
+        self.compactors[0].append(value)
+        self.size += 1
+        self.n += 1
+        if self.size >= self.max_size:
+            self._compress()
+
+    def update_many(self, values: Iterable[float]) -> None:
+        for value in values:
+            self.update(value)
+
+    def _compress(self) -> None:
+        """ Halve the lowest full compactor: sort, keep every other item (random offset) one level up. """
+        for h, compactor in enumerate(self.compactors):
+            if len(compactor) >= self._capacity(h):
+                if h + 1 == len(self.compactors):
+                    self._grow()
+                compactor.sort()
+                keep = compactor.pop() if len(compactor) % 2 else None
+                self.compactors[h + 1].extend(compactor[self._rng.random() < 0.5::2])
+                self.compactors[h] = [] if keep is None else [keep]
+                self.size = sum(len(c) for c in self.compactors)
+                if self.size < self.max_size:
+                    return
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        """ Fold other into self (in place) and return self. """
+        while len(self.compactors) < len(other.compactors):
+            self._grow()
+        for h, compactor in enumerate(other.compactors):
+            self.compactors[h].extend(compactor)
+        self.n += other.n
+        self.size = sum(len(c) for c in self.compactors)
+        while self.size >= self.max_size:
+            self._compress()
+        return self
+
+    def quantile(self, q: float) -> float | None:
+        if not self.n:
+            return None
+        return self.quantiles([q])[0]
+
+    def quantiles(self, qs: Iterable[float]) -> list[float | None]:
+        weighted = sorted((value, 1 << h) for h, c in enumerate(self.compactors) for value in c)
+        if not weighted:
+            return [None for _ in qs]
+        total = sum(weight for _, weight in weighted)
+        out = []
+        for q in qs:
+            target, seen = q * total, 0
+            for value, weight in weighted:
+                seen += weight
+                if seen >= target:
+                    break
+            out.append(value)
+        return out
+
+
+def stable_hash64(value: object) -> int:
+    """ 64-bit hash of repr(value), identical across processes (unlike hash() on str). """
+    return int.from_bytes(blake2b(repr(value).encode(), digest_size=8).digest(), "little")
+
+
+class HyperLogLog:
+    """ Distinct-count sketch with 2**p one-byte registers; relative error ~1.04/sqrt(2**p). """
+    def __init__(self, p: int = 12) -> None:
+        if not 4 <= p <= 16:
+            raise ValueError("p must be between 4 and 16")
+        self.p = p
+        self.registers = bytearray(1 << p)
+
+    def update(self, value: object) -> None:
+        x = stable_hash64(value)
+        bits = 64 - self.p
+        idx, rest = x >> bits, x & ((1 << bits) - 1)
+        rank = bits - rest.bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def update_many(self, values: Iterable[object]) -> None:
+        for value in values:
+            self.update(value)
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        """ Fold other into self (in place) and return self. """
+        if other.p != self.p:
+            raise ValueError("cannot merge HyperLogLog sketches with different p")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def estimate(self) -> float:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            return m * math.log(m / zeros)  # linear counting for small cardinalities
+        return raw
+
+    def __len__(self) -> int:
+        return round(self.estimate())
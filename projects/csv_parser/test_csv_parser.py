@@ -3,8 +3,12 @@ Tests for CSV Parser + Streaming Aggregation
 Run: pytest test_csv.py -v
 """
 
+import io
+import json
+
 import pytest
-from csv_parser import CSVParser, WindowAggregator
+from csv_parser import CSVParser, CSVWriter, WindowAggregator, GroupedWindowAggregator, main
+from sketches import HyperLogLog, KLLSketch, stable_hash64
 
 
 # ============================================================
@@ -211,3 +215,559 @@ class TestLevel3:
         # Window [10, 20): rows at ts=12.0 and ts=15.0
         assert results[1]["count"] == 2
         assert results[1]["avg"] == 35.0
+
+
+# ============================================================
+# Level 4: Fast parsing mode
+# ============================================================
+
+TRICKY_ROWS = [
+    "", "a,b,c", ",,", "a,b,", ",a", '"hello, world",b', '"say ""hi""",b', '"",b',
+    '"a","b","c"', 'a,"b,c",d', 'ab"c,d', '"ab"cd,e', '"ab"c"d",e', '"unterminated,x',
+    '"a""', '""""', '","', 'x,"', '"a"b"c"', " a , b ", "10,3.14,hello",
+]
+
+
+class TestLevel4:
+    @pytest.mark.parametrize("row", TRICKY_ROWS)
+    def test_fast_matches_state_machine(self, row):
+        assert CSVParser(fast=True).parse_row(row) == CSVParser().parse_row(row)
+
+    def test_fast_matches_state_machine_fuzz(self):
+        import random
+        rng = random.Random(0)
+        slow, fast = CSVParser(quote="'", delimiter=";"), CSVParser(quote="'", delimiter=";", fast=True)
+        for _ in range(5000):
+            row = "".join(rng.choice("ab;'' ,") for _ in range(rng.randint(0, 25)))
+            assert fast.parse_row(row) == slow.parse_row(row), row
+
+    def test_fast_iter(self):
+        parser = CSVParser(fast=True)
+        rows = list(parser.iter(iter(['a,"b,c"', "1,2,3"])))
+        assert rows == [["a", "b,c"], [1, 2, 3]]
+
+    def test_multichar_delimiter_falls_back(self):
+        parser = CSVParser(delimiter="::", fast=True)
+        assert parser.fast is False
+        assert parser.parse_row("a::b") == CSVParser(delimiter="::").parse_row("a::b")
+
+
+# ============================================================
+# Level 5: Multi-line quoted fields + chunked file reading
+# ============================================================
+
+class TestLevel5:
+    def test_iter_multiline_quoted_field(self):
+        parser = CSVParser()
+        lines = ['1,"first line', 'second, line",x', "2,plain,y"]
+        assert list(parser.iter(lines)) == [[1, "first line\nsecond, line", "x"], [2, "plain", "y"]]
+
+    def test_iter_escaped_quote_before_newline(self):
+        parser = CSVParser()
+        lines = ['"he said ""', 'bye""",z']
+        assert list(parser.iter(lines)) == [['he said "\nbye"', "z"]]
+
+    def test_literal_quote_in_unquoted_field_does_not_join(self):
+        parser = CSVParser()
+        assert list(parser.iter(['5" screen,a', "b,c"])) == [['5" screen', "a"], ["b", "c"]]
+
+    def test_unterminated_quote_at_eof(self):
+        parser = CSVParser()
+        assert list(parser.iter(['"never closed', "more"])) == [["never closed\nmore"]]
+
+    @pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 1 << 20])
+    def test_iter_from_file_chunk_boundaries(self, tmp_path, chunk_size):
+        path = tmp_path / "data.csv"
+        path.write_bytes('name,note\r\n"Zoë","multi\r\nline, ok"\r\nJosé,"naïve ""q"""\r\n4,5'.encode())
+        rows = list(CSVParser().iter_from_file(str(path), chunk_size=chunk_size))
+        assert rows == [["name", "note"], ["Zoë", "multi\nline, ok"], ["José", 'naïve "q"'], [4, 5]]
+
+    def test_iter_from_file_example(self):
+        rows = list(CSVParser().iter_from_file("example.csv", chunk_size=16))
+        assert rows[0] == ["Joe Lee", "NYC", 3.8, 1.0]
+        assert rows[1] == ["Mike S.", "SF,CA", 4.0, 3.0]
+
+    def test_iter_chunks_bytes(self):
+        chunks = [b'a,"b', b'\nc",d\n', b"1,2\n"]
+        assert list(CSVParser(fast=True).iter_chunks(chunks)) == [["a", "b\nc", "d"], [1, 2]]
+
+
+# ============================================================
+# Level 6: Parallel parsing over byte ranges
+# ============================================================
+
+class TestLevel6:
+    @pytest.fixture
+    def multiline_file(self, tmp_path):
+        lines = []
+        for i in range(400):
+            if i % 3 == 0:
+                lines.append(f'{i},"note {i}\nspans, lines ""q""",{i * 0.5}')
+            else:
+                lines.append(f"{i},plain {i},{i * 0.5}")
+        path = tmp_path / "multi.csv"
+        path.write_text("\n".join(lines) + "\n")
+        return str(path)
+
+    def test_parallel_ordered_matches_sequential(self, multiline_file):
+        parser = CSVParser(fast=True)
+        expected = list(parser.iter_from_file(multiline_file))
+        rows = list(parser.iter_parallel(multiline_file, workers=2, range_bytes=257))
+        assert rows == expected
+
+    def test_parallel_unordered_same_rows(self, multiline_file):
+        parser = CSVParser()
+        expected = list(parser.iter_from_file(multiline_file))
+        rows = list(parser.iter_parallel(multiline_file, workers=2, ordered=False, range_bytes=500))
+        assert sorted(rows, key=lambda row: row[0]) == expected
+
+    def test_parallel_small_file_single_process(self):
+        rows = list(CSVParser().iter_parallel("example.csv"))
+        assert rows == list(CSVParser().iter_from_file("example.csv"))
+
+    def test_record_boundaries_skip_quoted_newlines(self, tmp_path):
+        from csv_parser import _record_boundaries
+        data = b'a,"x\ny\nz"\nb,c\n'
+        path = tmp_path / "b.csv"
+        path.write_bytes(data)
+        # a range starting inside the quoted field resyncs after the closing quote
+        boundaries = _record_boundaries(str(path), [0, 5], [data[:5].count(b'"')], b'"')
+        assert boundaries == [0, data.index(b"b,c")]
+
+
+# ============================================================
+# Level 7: Schema-driven conversion
+# ============================================================
+
+class TestLevel7:
+    def test_explicit_schema(self):
+        parser = CSVParser(schema=[str, float, int])
+        assert parser.parse_row("7,3,42") == ["7", 3.0, 42]
+
+    def test_none_keeps_raw_string(self):
+        parser = CSVParser(schema=[None, int])
+        assert parser.parse_row("007,5") == ["007", 5]
+
+    def test_schema_violation_falls_back_per_cell(self):
+        parser = CSVParser(schema=[int, int])
+        assert parser.parse_row("1,n/a") == [1, "n/a"]
+        assert parser.parse_row("1,") == [1, ""]
+
+    def test_extra_columns_use_default_coercion(self):
+        parser = CSVParser(schema=[None])
+        assert parser.parse_row("1,2,x") == ["1", 2, "x"]
+
+    def test_infer_schema(self):
+        parser = CSVParser()
+        rows = [["1", "2.5", "a", ""], ["3", "4", "b", "9"]]
+        assert parser.infer_schema(rows) == [int, float, None, int]
+
+    def test_inferred_types_are_stable(self):
+        """A float column stays float even when a later cell looks like an int."""
+        parser = CSVParser(schema="infer", infer_rows=2)
+        rows = list(parser.iter(["a,1.5", "b,2.5", "c,3"]))
+        assert rows == [["a", 1.5], ["b", 2.5], ["c", 3.0]]
+        assert isinstance(rows[2][1], float)
+
+    def test_infer_from_file(self):
+        parser = CSVParser(schema="infer", fast=True)
+        rows = list(parser.iter_from_file("example.csv"))
+        assert rows[0] == ["Joe Lee", "NYC", 3.8, 1.0]
+        assert all(isinstance(row[3], float) for row in rows)
+
+    def test_infer_matches_default_for_consistent_columns(self):
+        lines = ["1,x,2.5", "2,y,3.5", "3,z,4.25"]
+        assert list(CSVParser(schema="infer").iter(lines)) == list(CSVParser().iter(lines))
+
+
+# ============================================================
+# Level 8: Column projection + predicate pushdown
+# ============================================================
+
+class TestLevel8:
+    LINES = ['Joe,NYC,3.8,1.0,x', 'Mike,"SF,CA",4.0,3.0,y', 'Ann,NYC,2.5,7.0,"z,z"']
+
+    @pytest.mark.parametrize("fast", [False, True])
+    def test_columns_projection(self, fast):
+        rows = list(CSVParser(fast=fast).iter(self.LINES, columns=[3, 0]))
+        assert rows == [[1.0, "Joe"], [3.0, "Mike"], [7.0, "Ann"]]
+
+    @pytest.mark.parametrize("fast", [False, True])
+    def test_where_equality_on_raw_text(self, fast):
+        rows = list(CSVParser(fast=fast).iter(self.LINES, columns=[0, 2], where={1: "NYC"}))
+        assert rows == [["Joe", 3.8], ["Ann", 2.5]]
+
+    def test_where_callable_without_projection(self):
+        rows = list(CSVParser().iter(self.LINES, where={2: lambda raw: raw.startswith("4")}))
+        assert rows == [["Mike", "SF,CA", 4.0, 3.0, "y"]]
+
+    def test_where_column_outside_projection_stops_after_it(self):
+        parser = CSVParser(fast=True)
+        assert parser._split_row('a,"b,c",d,e', limit=2)[:2] == ["a", "b,c"]
+        rows = list(parser.iter(self.LINES, columns=[0], where={1: "SF,CA"}))
+        assert rows == [["Mike"]]
+
+    def test_projection_uses_schema(self):
+        parser = CSVParser(schema=[None, None, float, float, None])
+        rows = list(parser.iter(["a,b,1,2,c"], columns=[3, 2]))
+        assert rows == [[2.0, 1.0]]
+        assert isinstance(rows[0][0], float)
+
+    def test_projection_from_file(self):
+        rows = list(CSVParser(fast=True).iter_from_file("example.csv", columns=[0], where={1: "SF,CA"}))
+        assert rows == [["Mike S."], ["Bob"], ["Eve"]]
+
+
+# ============================================================
+# Level 9: Columnar batches
+# ============================================================
+
+class TestLevel9:
+    LINES = ["a,1,0.5", "b,2,1.5", "c,3,2.5", "d,4,3.5", "e,5,4.5"]
+
+    def test_batches_are_column_oriented(self):
+        from array import array
+        batches = list(CSVParser().iter_batches(self.LINES, batch_rows=2, use_numpy=False))
+        assert len(batches) == 3
+        names, ints, floats = batches[0]
+        assert names == ["a", "b"]
+        assert ints == array("q", [1, 2])
+        assert floats == array("d", [0.5, 1.5])
+        assert batches[2][1] == array("q", [5])
+
+    def test_batches_do_not_change_parser_schema(self):
+        parser = CSVParser()
+        list(parser.iter_batches(self.LINES, use_numpy=False))
+        assert parser.parse_row("1.0,x") == [1.0, "x"]
+        assert parser._converters is None
+
+    def test_batches_with_projection_and_where(self):
+        batches = list(CSVParser(fast=True).iter_batches(
+            self.LINES, columns=[2, 0], where={1: lambda raw: int(raw) % 2 == 1}, use_numpy=False))
+        assert [list(col) for col in batches[0]] == [[0.5, 2.5, 4.5], ["a", "c", "e"]]
+
+    def test_batches_explicit_schema(self):
+        parser = CSVParser(schema=[None, float, None])
+        (batch,) = parser.iter_batches(self.LINES, use_numpy=False)
+        assert batch[1].typecode == "d"
+        assert batch[2] == ["0.5", "1.5", "2.5", "3.5", "4.5"]
+
+    def test_numeric_column_with_bad_cell_falls_back(self):
+        parser = CSVParser(schema=[int])
+        (batch,) = parser.iter_batches(["1", "", "3"], use_numpy=False)
+        assert batch == [[1, "", 3]]
+
+    def test_batches_from_file(self):
+        batches = list(CSVParser().iter_batches_from_file("example.csv", columns=[3, 2], use_numpy=False))
+        ts, vals = batches[0]
+        assert list(ts[:2]) == [1.0, 3.0]
+        assert list(vals[:2]) == [3.8, 4.0]
+
+    def test_numpy_batches(self):
+        np = pytest.importorskip("numpy")
+        (batch,) = CSVParser().iter_batches(self.LINES, use_numpy=True)
+        assert batch[1].dtype == np.int64
+        assert batch[2].sum() == pytest.approx(12.5)
+
+
+# ============================================================
+# Level 10: Grouped, sliding and session windows
+# ============================================================
+
+def _windows(results):
+    return [(r["key"], r["window_start"], r["window_end"], r["count"], r["sum"]) for r in results]
+
+
+class TestLevel10:
+    def test_tumbling_matches_window_aggregator(self):
+        rows = [[v, t] for v, t in [(10, 1.0), (20, 5.0), (30, 12.0), (40, 15.0), (50, 31.0)]]
+        single = WindowAggregator(window_size=10, ts_index=1, val_index=0)
+        grouped = GroupedWindowAggregator(window_size=10, ts_index=1, val_index=0)
+        expected, got = [], []
+        for row in rows:
+            result = single.add_row(row)
+            if result:
+                expected.append(result)
+            got.extend(grouped.add_row(row))
+        expected.append(single.flush())
+        got.extend(grouped.flush())
+        for e, g in zip(expected, got, strict=True):
+            for field in ("count", "sum", "avg", "min", "max", "window_start", "window_end"):
+                assert e[field] == g[field]
+
+    def test_group_by_key(self):
+        agg = GroupedWindowAggregator(window_size=10, ts_index=0, val_index=1, key_index=2)
+        for row in [[1, 1.0, "a"], [2, 2.0, "b"], [3, 3.0, "a"]]:
+            assert agg.add_row(row) == []
+        closed = agg.add_row([10, 5.0, "b"])
+        assert _windows(closed) == [("a", 0, 10, 2, 4.0), ("b", 0, 10, 1, 2.0)]
+        assert _windows(agg.flush()) == [("b", 10, 20, 1, 5.0)]
+
+    def test_sliding_windows(self):
+        agg = GroupedWindowAggregator(window_size=10, slide=5)
+        closed = agg.add_batch([1, 6, 12], [1.0, 2.0, 3.0]) + agg.flush()
+        assert [(r["window_start"], r["count"], r["sum"]) for r in closed] == [
+            (-5, 1, 1.0), (0, 2, 3.0), (5, 2, 5.0), (10, 1, 3.0)]
+
+    def test_hopping_windows_skip_gaps(self):
+        agg = GroupedWindowAggregator(window_size=5, slide=10)
+        closed = agg.add_batch([1, 7, 12], [1.0, 2.0, 3.0]) + agg.flush()
+        assert [(r["window_start"], r["count"]) for r in closed] == [(0, 1), (10, 1)]
+        assert agg.late_rows == 0
+
+    def test_watermark_allows_out_of_order_rows(self):
+        agg = GroupedWindowAggregator(window_size=10, allowed_lateness=5)
+        assert agg.add_batch([8, 13, 4], [1.0, 1.0, 1.0]) == []
+        closed = agg.add_batch([15, 2], [1.0, 1.0])
+        assert _windows(closed) == [(None, 0, 10, 2, 2.0)]
+        assert agg.late_rows == 1
+
+    def test_late_rows_are_dropped(self):
+        agg = GroupedWindowAggregator(window_size=10)
+        agg.add_batch([1, 25], [1.0, 1.0])
+        assert agg.add_batch([3, 26], [5.0, 1.0]) == []
+        assert agg.late_rows == 1
+        assert _windows(agg.flush()) == [(None, 20, 30, 2, 2.0)]
+
+    def test_session_windows(self):
+        agg = GroupedWindowAggregator(session_gap=5, key_index=2)
+        rows = [[0, 1.0, "a"], [3, 2.0, "a"], [4, 1.0, "b"], [7, 3.0, "a"]]
+        assert [r for row in rows for r in agg.add_row(row)] == []
+        closed = agg.add_row([13, 4.0, "a"])
+        assert _windows(closed) == [("a", 0, 12, 3, 6.0), ("b", 4, 9, 1, 1.0)]
+        assert _windows(agg.flush()) == [("a", 13, 18, 1, 4.0)]
+
+    def test_session_late_and_out_of_order(self):
+        agg = GroupedWindowAggregator(session_gap=5, allowed_lateness=3)
+        agg.add_batch([10, 8], [1.0, 1.0])  # 8 extends the session backwards
+        closed = agg.add_batch([20, 1], [1.0, 1.0])
+        assert _windows(closed) == [(None, 8, 15, 2, 2.0)]
+        assert agg.late_rows == 1
+
+    def test_slots_are_reused(self):
+        agg = GroupedWindowAggregator(window_size=1, key_index=1)
+        for t in range(1000):
+            agg.add_batch([t, t], [1.0, 1.0], ["x", "y"])
+        assert len(agg._count) <= 4
+
+    def test_add_batch_from_iter_batches(self):
+        lines = [f"s{i % 3},{i},{i * 0.5}" for i in range(30)]
+        agg = GroupedWindowAggregator(window_size=10)
+        results = []
+        for keys, ts, vals in CSVParser(schema=[None, int, float]).iter_batches(
+                lines, batch_rows=7, use_numpy=False):
+            results += agg.add_batch(ts, vals, keys)
+        results += agg.flush()
+        assert sum(r["count"] for r in results) == 30
+        assert len(results) == 9
+        assert {r["key"] for r in results} == {"s0", "s1", "s2"}
+
+    def test_requires_window(self):
+        with pytest.raises(ValueError):
+            GroupedWindowAggregator()
+        with pytest.raises(ValueError):
+            GroupedWindowAggregator(window_size=10, slide=0)
+
+
+# ============================================================
+# Level 11: Sketch aggregates
+# ============================================================
+
+class TestLevel11:
+    def test_kll_quantiles_within_rank_error(self):
+        import random
+        rng = random.Random(1)
+        values = [rng.random() for _ in range(100_000)]
+        sketch = KLLSketch(k=200, seed=1)
+        sketch.update_many(values)
+        assert sketch.n == 100_000
+        assert sketch.size < 3 * 200 + 50  # bounded, not O(n)
+        ordered = sorted(values)
+        for q in (0.01, 0.5, 0.95, 0.99):
+            rank = ordered.index(sketch.quantile(q)) / len(values)
+            assert abs(rank - q) < 0.02
+
+    def test_kll_small_and_empty(self):
+        sketch = KLLSketch()
+        assert sketch.quantile(0.5) is None
+        sketch.update_many([3, 1, 2])
+        assert sketch.quantiles([0.0, 0.5, 1.0]) == [1, 2, 3]
+
+    def test_kll_merge(self):
+        a, b = KLLSketch(seed=1), KLLSketch(seed=2)
+        a.update_many(range(0, 50_000))
+        b.update_many(range(50_000, 100_000))
+        merged = a.merge(b)
+        assert merged.n == 100_000
+        assert abs(merged.quantile(0.5) - 50_000) < 2_000
+        assert abs(merged.quantile(0.99) - 99_000) < 2_000
+
+    def test_hll_estimate_and_merge(self):
+        a, b = HyperLogLog(), HyperLogLog()
+        a.update_many(f"user{i}" for i in range(30_000))
+        a.update_many(f"user{i}" for i in range(30_000))  # duplicates
+        b.update_many(f"user{i}" for i in range(20_000, 50_000))
+        assert abs(a.estimate() - 30_000) / 30_000 < 0.05
+        assert abs(len(a.merge(b)) - 50_000) / 50_000 < 0.05
+        with pytest.raises(ValueError):
+            a.merge(HyperLogLog(p=10))
+
+    def test_hll_small_cardinality(self):
+        sketch = HyperLogLog()
+        sketch.update_many([1, 2, 3, 2, 1])
+        assert len(sketch) == 3
+
+    def test_hash_is_stable_across_processes(self):
+        import subprocess
+        import sys
+        out = subprocess.run([sys.executable, "-c", "from sketches import stable_hash64; "
+                              "print(stable_hash64('sensor-7'))"], capture_output=True, text=True)
+        assert int(out.stdout) == stable_hash64("sensor-7")
+
+    def test_sketches_pickle(self):
+        import pickle
+        kll, hll = KLLSketch(), HyperLogLog()
+        kll.update_many(range(1000))
+        hll.update_many(range(1000))
+        assert pickle.loads(pickle.dumps(kll)).quantile(0.5) == kll.quantile(0.5)
+        assert pickle.loads(pickle.dumps(hll)).estimate() == hll.estimate()
+
+    def test_window_aggregator_sketch_fields(self):
+        agg = WindowAggregator(window_size=100, ts_index=0, val_index=1,
+                               quantiles=(0.5, 0.99), distinct_index=2)
+        for i in range(100):
+            agg.add_row([i, float(i), f"u{i % 10}"])
+        result = agg.flush()
+        assert result["p50"] == pytest.approx(50, abs=1)
+        assert result["p99"] == pytest.approx(99, abs=1)
+        assert result["distinct"] == 10
+
+    def test_grouped_sketch_fields(self):
+        agg = GroupedWindowAggregator(window_size=10, key_index=2, quantiles=(0.5,), distinct_index=3)
+        for t in range(10):
+            agg.add_row([t, float(t), "a", t % 4])
+            agg.add_row([t, 1.0, "b", "same"])
+        a, b = agg.flush()
+        assert (a["key"], a["p50"], a["distinct"]) == ("a", pytest.approx(4.5, abs=0.5), 4)
+        assert (b["key"], b["p50"], b["distinct"]) == ("b", 1.0, 1)
+
+    def test_partition_sketches_merge(self):
+        parts = [GroupedWindowAggregator(window_size=10, quantiles=(0.5,), distinct_index=2,
+                                         emit_sketches=True) for _ in range(2)]
+        for t in range(10):
+            parts[t % 2].add_row([t, float(t), f"u{t}"])
+        (left,), (right,) = (p.flush() for p in parts)
+        assert left["distinct"] == right["distinct"] == 5
+        assert len(left["distinct_sketch"].merge(right["distinct_sketch"])) == 10
+        assert left["quantile_sketch"].merge(right["quantile_sketch"]).n == 10
+
+    def test_sketches_off_by_default(self):
+        (result,) = GroupedWindowAggregator(window_size=10).add_batch([1, 20], [1.0, 2.0])
+        assert "distinct" not in result and "p50" not in result
+
+
+# ============================================================
+# Level 12: CSV writer
+# ============================================================
+
+class TestLevel12:
+    ROWS = [["plain", "with, comma", 'say "hi"', "", "multi\nline"],
+            ['"leading', "trailing\r", " spaced ", "a\"b", "x"]]
+
+    def test_quotes_only_when_needed(self):
+        writer = CSVWriter(io.StringIO())
+        assert writer.format_row(["a", "b c", 1, 2.5, None]) == "a,b c,1,2.5,"
+        assert writer.format_row(["a,b", 'q"q', "l\nf", "c\rr"]) == '"a,b","q""q","l\nf","c\rr"'
+
+    @pytest.mark.parametrize("fast", [False, True])
+    def test_round_trip(self, fast):
+        out = io.StringIO()
+        with CSVWriter(out, buffer_rows=1) as writer:
+            writer.writerows(self.ROWS)
+        parser = CSVParser(fast=fast, schema=[None] * 5)
+        assert list(parser.iter(io.StringIO(out.getvalue()))) == self.ROWS
+
+    def test_round_trip_fuzz(self):
+        import random
+        import re
+        rng = random.Random(7)
+        alphabet = ["a", "b", " ", ",", '"', "\n", "\r", ";", "é"]
+        rows = [["".join(rng.choice(alphabet) for _ in range(rng.randrange(6)))
+                 for _ in range(4)] for _ in range(500)]
+        # the parser strips "\r" before each line break of a multi-line field
+        rows = [[re.sub("\r+\n", "\n", cell) for cell in row] for row in rows]
+        for delimiter, quote in ((",", '"'), (";", "'"), ("\t", '"')):
+            out = io.StringIO()
+            with CSVWriter(out, delimiter=delimiter, quote=quote) as writer:
+                writer.writerows(rows)
+            parser = CSVParser(delimiter=delimiter, quote=quote, schema=[None] * 4)
+            assert list(parser.iter(io.StringIO(out.getvalue()))) == rows
+
+    def test_values_round_trip_without_schema(self):
+        out = io.StringIO()
+        with CSVWriter(out) as writer:
+            writer.writerows([[1, 2.5, "x", -3e-7]])
+        assert CSVParser().parse([out.getvalue()]) == [[1, 2.5, "x", -3e-7]]
+
+    def test_from_parser_and_file(self, tmp_path):
+        parser = CSVParser(delimiter="|", quote="'")
+        path = tmp_path / "out.csv"
+        with CSVWriter.from_parser(str(path), parser, lineterminator="\r\n") as writer:
+            writer.writerow(["a|b", "it's", 3])
+            writer.writerow(["c", "d", 4])
+        assert path.read_bytes() == b"'a|b'|'it''s'|3\r\nc|d|4\r\n"
+        assert list(parser.iter_from_file(str(path))) == [["a|b", "it's", 3], ["c", "d", 4]]
+
+    def test_buffers_rows(self):
+        out = io.StringIO()
+        writer = CSVWriter(out, buffer_rows=3)
+        writer.writerow(["a"])
+        writer.writerow(["b"])
+        assert out.getvalue() == ""
+        writer.writerow(["c"])
+        assert out.getvalue() == "a\nb\nc\n"
+        writer.writerow(["d"])
+        writer.flush()
+        assert out.getvalue() == "a\nb\nc\nd\n"
+
+
+# ============================================================
+# Level 13: Command line
+# ============================================================
+
+class TestLevel13:
+    def test_import_has_no_side_effects(self, tmp_path):
+        import subprocess
+        import sys
+        here = str(__import__("pathlib").Path(__file__).parent)
+        out = subprocess.run([sys.executable, "-c", f"import sys; sys.path.insert(0, {here!r}); import csv_parser"],
+                             cwd=tmp_path, capture_output=True, text=True)
+        assert out.returncode == 0
+        assert out.stdout == "" and out.stderr == ""
+
+    def test_stats(self, capsys):
+        assert main(["stats", "example.csv", "--window", "10", "--ts", "3", "--val", "2"]) == 0
+        out, err = capsys.readouterr()
+        windows = [json.loads(line) for line in out.splitlines()]
+        assert [(w["window_start"], w["count"]) for w in windows] == [(0.0, 4), (10.0, 3), (20.0, 1)]
+        assert "MB/s" in err
+        assert "8 rows (0 skipped), 3 windows" in err
+
+    def test_stats_grouped_skips_header(self, tmp_path, capsys):
+        path = tmp_path / "readings.csv"
+        path.write_text("sensor,ts,value\na,1,2.0\nb,2,3.0\na,12,4.0\n")
+        main(["stats", str(path), "--window", "10", "--ts", "1", "--val", "2", "--key", "0",
+              "--chunk-size", "4", "--progress-interval", "0"])
+        out, err = capsys.readouterr()
+        windows = [(w["key"], w["window_start"], w["sum"]) for w in map(json.loads, out.splitlines())]
+        assert windows == [("a", 0.0, 2.0), ("b", 0.0, 3.0), ("a", 10.0, 4.0)]
+        assert "4 rows (1 skipped)" in err
+        assert err.count("MB/s") > 1  # periodic progress lines
+
+    def test_quiet(self, capsys):
+        main(["stats", "example.csv", "--window", "10", "--ts", "3", "--val", "2", "--quiet"])
+        assert capsys.readouterr().err == ""
+
+    def test_requires_arguments(self, capsys):
+        with pytest.raises(SystemExit):
+            main(["stats", "example.csv"])
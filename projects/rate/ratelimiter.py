@@ -1,8 +1,16 @@
 import math
+import os
+import struct
+import sys
+import threading
 import time
+from array import array
+from bisect import bisect_left
+from heapq import heappop, heappush
 from dataclasses import dataclass
 from collections import defaultdict, deque
-from collections.abc import Callable
+from collections.abc import Callable, Sequence
+from itertools import accumulate
                                                                                                 
 @dataclass                                                                                        
 class BucketState:
@@ -12,7 +20,8 @@ class BucketState:
 
 class RateLimiter:
     def __init__(self, max_requests: int, window_seconds: int, strategy: str = "fixed",
-                 bucket_capacity: int | None = None, refill_rate: float | None = None):
+                 bucket_capacity: int | None = None, refill_rate: float | None = None,
+                 clock: Callable[[], float] = time.time):
         self._max_requests = max_requests
         self._window_seconds = window_seconds
         self._strategy = strategy
@@ -23,47 +32,45 @@ class RateLimiter:
         self._logs = defaultdict(deque) # for sliding window
         self._buckets = {} # for token bucket
         self._callback = None
+        self._clock = clock # injectable for simulation / tests
+        self._checkpoint_stop: threading.Event | None = None
+        self._metrics: RateLimiterMetrics | None = None
    
     def allow(self, client_id: str) -> bool:
-        if self._strategy == "fixed":
-            allowed = self._allow_fixed(client_id)
-        elif self._strategy == "sliding_log":
-            allowed = self._allow_sliding(client_id)
-        else:
-            allowed = self._allow_bucket(client_id)
-        
+        metrics = self._metrics
+        if metrics is not None:
+            start = time.perf_counter_ns()
+        now = self._clock()
+        allowed = self._admit(client_id, now)
+        if allowed:
+            self._commit(client_id, now)
+        if metrics is not None:
+            metrics.record(self._strategy, client_id, allowed, time.perf_counter_ns() - start)
         if not allowed and self._callback:
             self._callback(client_id)
-        
+
         return allowed
 
-    def _allow_fixed(self, client_id: str) -> bool:
-        now = time.time()
-        self._fixed_peek(now)
-        if self._counter[client_id] >= self._max_requests:
-            return False
-        
-        self._counter[client_id] += 1
-        return True
-    
-    def _allow_sliding(self, client_id: str) -> bool:
-        now = time.time()
-        self._sliding_peek(client_id, now)
+    def _admit(self, client_id: str, now: float) -> bool:
+        """Check whether a request would be allowed at `now` without consuming it."""
+        if self._strategy == "fixed":
+            self._fixed_peek(now)
+            return self._counter[client_id] < self._max_requests
+        elif self._strategy == "sliding_log":
+            self._sliding_peek(client_id, now)
+            return len(self._logs[client_id]) < self._max_requests
+        else:
+            self._bucket_peek(client_id, now)
+            return self._buckets[client_id].tokens >= 1
 
-        if len(self._logs[client_id]) >= self._max_requests:
-            return False
-        
-        self._logs[client_id].append(now)
-        return True
-    
-    def _allow_bucket(self, client_id: str) -> bool:
-        now = time.time()
-        self._bucket_peek(client_id, now)
-        if self._buckets[client_id].tokens < 1:
-            return False
-        
-        self._buckets[client_id].tokens -= 1
-        return True
+    def _commit(self, client_id: str, now: float) -> None:
+        """Consume one request; only valid right after `_admit` returned True."""
+        if self._strategy == "fixed":
+            self._counter[client_id] += 1
+        elif self._strategy == "sliding_log":
+            self._logs[client_id].append(now)
+        else:
+            self._buckets[client_id].tokens -= 1
 
     def _fixed_peek(self, now: float) -> None:
         window = math.floor(now / self._window_seconds)
@@ -92,7 +99,9 @@ class RateLimiter:
 
     def remaining(self, client_id: str) -> int:
         """How many requests left in current window/bucket"""
-        now = time.time()
+        return self._remaining(client_id, self._clock())
+
+    def _remaining(self, client_id: str, now: float) -> int:
         if self._strategy == "fixed":
             self._fixed_peek(now)
             return self._max_requests - self._counter[client_id]
@@ -105,9 +114,11 @@ class RateLimiter:
 
     def retry_after(self, client_id: str) -> float | None:
         """seconds until next request allowed None if not limited"""
-        if self.remaining(client_id) > 0:
+        return self._retry_after(client_id, self._clock())
+
+    def _retry_after(self, client_id: str, now: float) -> float | None:
+        if self._remaining(client_id, now) > 0:
             return None
-        now = time.time()
         if self._strategy == "fixed":
             assert self._fixed_window is not None
             wait = (self._fixed_window + 1) * self._window_seconds - now
@@ -122,4 +133,445 @@ class RateLimiter:
 
     def on_reject(self, callback: Callable[[str], None]) -> None:
         """called with client_id when rejected"""
-        self._callback = callback
\ No newline at end of file
+        self._callback = callback
+
+    def instrument(self, metrics: "RateLimiterMetrics | None") -> None:
+        """Record every decision into metrics (None to detach)"""
+        self._metrics = metrics
+
+    # ------------------------------------------------------------
+    # Persistence: compact binary snapshot of _counter/_logs/_buckets
+    # ------------------------------------------------------------
+
+    def snapshot(self) -> bytes:
+        """Serialize limiter state.
+
+        Layout (little-endian): magic, fixed window, then one section per store
+        with client ids sorted and joined into a single NUL-separated UTF-8 blob,
+        followed by packed arrays: fixed counts as int64, sliding logs as lengths +
+        first timestamp + uint32/uint64 microsecond deltas, buckets as float64
+        tokens + last_refill.
+        """
+        # list(dict.items()) / list(deque) copy in C without releasing the GIL, so this
+        # is safe to call from a checkpoint thread while allow() keeps running
+        counter = sorted(_store_items(self._counter))
+        logs = sorted((client_id, list(log)) for client_id, log in _store_items(self._logs) if log)
+        buckets = sorted((client_id, state.tokens, state.last_refill)
+                         for client_id, state in _store_items(self._buckets))
+
+        fixed_window = math.nan if self._fixed_window is None else float(self._fixed_window)
+        parts = [_SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, fixed_window)]
+
+        parts += _pack_ids([client_id for client_id, _ in counter])
+        parts.append(_le(array("q", [count for _, count in counter])))
+
+        parts += _pack_ids([client_id for client_id, _ in logs])
+        lengths, firsts, deltas = array("I"), array("d"), []
+        for _, log in logs:
+            first = log[0]
+            lengths.append(len(log))
+            firsts.append(first)
+            prev = 0
+            for ts in log:
+                # Offsets from the first entry (not chained) so rounding never accumulates
+                offset = round((ts - first) * 1_000_000)
+                deltas.append(offset - prev)
+                prev = offset
+        wide = bool(deltas) and max(deltas) >= 2 ** 32
+        parts.append(b"Q" if wide else b"I")
+        parts += [_le(lengths), _le(firsts), _le(array("Q" if wide else "I", deltas))]
+
+        parts += _pack_ids([client_id for client_id, _, _ in buckets])
+        parts.append(_le(array("d", [tokens for _, tokens, _ in buckets])))
+        parts.append(_le(array("d", [last for _, _, last in buckets])))
+        return b"".join(parts)
+
+    def restore(self, data: bytes) -> None:
+        """Replace limiter state with a snapshot() payload.
+
+        Only the packed arrays are decoded here; each client's entry is rebuilt
+        on its next request (see _RestoredStore), so restore time does not grow
+        with the cost of building millions of dict entries.
+        """
+        view = memoryview(data)
+        magic, fixed_window = _SNAPSHOT_HEADER.unpack_from(view, 0)
+        if magic != _SNAPSHOT_MAGIC:
+            raise ValueError("not a RateLimiter snapshot")
+        pos = _SNAPSHOT_HEADER.size
+
+        ids, pos = _unpack_ids(view, pos)
+        counts, pos = _read_array("q", view, pos, len(ids))
+        counter = _RestoredStore(ids, counts.__getitem__, int)
+
+        ids, pos = _unpack_ids(view, pos)
+        typecode = chr(view[pos])
+        pos += 1
+        lengths, pos = _read_array("I", view, pos, len(ids))
+        firsts, pos = _read_array("d", view, pos, len(ids))
+        starts = array("Q", accumulate(lengths, initial=0))
+        deltas, pos = _read_array(typecode, view, pos, starts[-1])
+
+        def load_log(i: int) -> deque:
+            first = firsts[i]
+            offsets = accumulate(deltas[starts[i]:starts[i + 1]])
+            return deque(first + offset / 1_000_000 for offset in offsets)
+
+        logs = _RestoredStore(ids, load_log, deque)
+
+        ids, pos = _unpack_ids(view, pos)
+        tokens, pos = _read_array("d", view, pos, len(ids))
+        last_refill, pos = _read_array("d", view, pos, len(ids))
+        buckets = _RestoredStore(ids, lambda i: BucketState(tokens[i], last_refill[i]), None)
+
+        self._fixed_window = None if math.isnan(fixed_window) else int(fixed_window)
+        self._counter, self._logs, self._buckets = counter, logs, buckets
+
+    def save(self, filepath: str) -> None:
+        """Write a snapshot atomically (tmp file + rename)"""
+        tmp = f"{filepath}.tmp"
+        with open(tmp, "wb") as fp:
+            fp.write(self.snapshot())
+        os.replace(tmp, filepath)
+
+    def load(self, filepath: str) -> None:
+        with open(filepath, "rb") as fp:
+            self.restore(fp.read())
+
+    def start_checkpointing(self, filepath: str, interval_seconds: float) -> None:
+        """save() to filepath every interval_seconds from a daemon thread"""
+        self.stop_checkpointing()
+        stop = threading.Event()
+
+        def run() -> None:
+            while not stop.wait(interval_seconds):
+                self.save(filepath)
+
+        self._checkpoint_stop = stop
+        threading.Thread(target=run, name="ratelimiter-checkpoint", daemon=True).start()
+
+    def stop_checkpointing(self) -> None:
+        if self._checkpoint_stop is not None:
+            self._checkpoint_stop.set()
+            self._checkpoint_stop = None
+
+
+class _RestoredStore(dict):
+    """dict whose snapshot entries are materialized on first access.
+
+    Inserting millions of keys into a dict takes seconds, a bisect over the
+    sorted id list does not. Hydrated entries live in the dict itself, so the
+    hot path after a client's first request is a plain dict lookup.
+    """
+    def __init__(self, ids: list[str], load: Callable[[int], object],
+                 default: Callable[[], object] | None):
+        super().__init__()
+        self._ids = ids
+        self._load = load
+        self._default = default
+
+    def _find(self, key: str) -> int:
+        i = bisect_left(self._ids, key)
+        return i if i < len(self._ids) and self._ids[i] == key else -1
+
+    def __missing__(self, key: str) -> object:
+        i = self._find(key)
+        if i >= 0:
+            value = self._load(i)
+        elif self._default is not None:
+            value = self._default()
+        else:
+            raise KeyError(key)
+        self[key] = value
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        return dict.__contains__(self, key) or self._find(key) >= 0
+
+    def all_items(self) -> list[tuple[str, object]]:
+        items = list(self.items())
+        items += [(client_id, self._load(i)) for i, client_id in enumerate(self._ids)
+                  if not dict.__contains__(self, client_id)]
+        return items
+
+
+def _store_items(store: dict) -> list[tuple]:
+    return store.all_items() if isinstance(store, _RestoredStore) else list(store.items())
+
+
+_SNAPSHOT_MAGIC = b"RLS1"
+_SNAPSHOT_HEADER = struct.Struct("<4sd")
+_SECTION_HEADER = struct.Struct("<QQ")
+
+
+def _le(arr: array) -> bytes:
+    if sys.byteorder == "big":
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _read_array(typecode: str, view: memoryview, pos: int, count: int) -> tuple[array, int]:
+    arr = array(typecode)
+    end = pos + count * arr.itemsize
+    arr.frombytes(view[pos:end])
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr, end
+
+
+def _pack_ids(client_ids: list[str]) -> list[bytes]:
+    blob = "\0".join(client_ids).encode()
+    if blob.count(b"\0") != max(len(client_ids) - 1, 0):
+        raise ValueError("client ids must not contain NUL characters")
+    return [_SECTION_HEADER.pack(len(client_ids), len(blob)), blob]
+
+
+def _unpack_ids(view: memoryview, pos: int) -> tuple[list[str], int]:
+    n, size = _SECTION_HEADER.unpack_from(view, pos)
+    pos += _SECTION_HEADER.size
+    ids = str(view[pos:pos + size], "utf-8").split("\0") if n else []
+    return ids, pos + size
+
+
+class CompositeRateLimiter:
+    """A chain of limits (e.g. per-user, per-tenant, global) decided as one request.
+
+    Every limit is checked against a single clock read and tokens are committed only
+    when all of them admit, so a rejection by a later limit never burns quota in an
+    earlier one.
+    """
+    def __init__(self, limiters: Sequence[RateLimiter], clock: Callable[[], float] | None = None):
+        if not limiters:
+            raise ValueError("CompositeRateLimiter needs at least one limiter")
+        self._limiters = list(limiters)
+        self._callback = None
+        # Default to the first limiter's clock so virtual clocks are shared
+        self._clock = clock if clock is not None else self._limiters[0]._clock
+        self._metrics: RateLimiterMetrics | None = None
+
+    def _keys(self, client_ids: str | Sequence[str]) -> Sequence[str]:
+        # A single id is used as the key for every limit in the chain
+        if isinstance(client_ids, str):
+            return [client_ids] * len(self._limiters)
+        if len(client_ids) != len(self._limiters):
+            raise ValueError(f"expected {len(self._limiters)} client ids, got {len(client_ids)}")
+        return client_ids
+
+    def allow(self, client_ids: str | Sequence[str]) -> bool:
+        """client_ids[i] is the key checked against limiter i"""
+        metrics = self._metrics
+        if metrics is not None:
+            start = time.perf_counter_ns()
+        keys = self._keys(client_ids)
+        now = self._clock()
+        for limiter, key in zip(self._limiters, keys):
+            if not limiter._admit(key, now):
+                if metrics is not None:
+                    metrics.record("composite", key, False, time.perf_counter_ns() - start)
+                if self._callback:
+                    self._callback(key)
+                return False
+
+        for limiter, key in zip(self._limiters, keys):
+            limiter._commit(key, now)
+        if metrics is not None:
+            metrics.record("composite", keys[0], True, time.perf_counter_ns() - start)
+        return True
+
+    def remaining(self, client_ids: str | Sequence[str]) -> int:
+        """Requests left before any limit in the chain rejects"""
+        now = self._clock()
+        return min(limiter._remaining(key, now)
+                   for limiter, key in zip(self._limiters, self._keys(client_ids)))
+
+    def retry_after(self, client_ids: str | Sequence[str]) -> float | None:
+        """Max wait across the chain, None if no limit is exhausted"""
+        now = self._clock()
+        waits = [limiter._retry_after(key, now)
+                 for limiter, key in zip(self._limiters, self._keys(client_ids))]
+        waits = [wait for wait in waits if wait is not None]
+        return max(waits) if waits else None
+
+    def on_reject(self, callback: Callable[[str], None]) -> None:
+        """called with the key of the first limit that rejected"""
+        self._callback = callback
+
+    def instrument(self, metrics: "RateLimiterMetrics | None") -> None:
+        """Record every decision (strategy "composite") into metrics"""
+        self._metrics = metrics
+
+
+
+# ============================================================
+# Observability
+# ============================================================
+
+class SpaceSaving:
+    """Top-k heavy hitters in O(k) memory (Metwally et al. space-saving sketch).
+
+    Each tracked key's count overestimates its true count by at most its error.
+    """
+    def __init__(self, k: int):
+        self._k = k
+        self._counts: dict[str, int] = {}
+        self._errors: dict[str, int] = {}
+        # One entry per key; stored counts may lag the real ones (they only grow),
+        # so stale entries are refreshed lazily when they reach the top
+        self._heap: list[tuple[int, str]] = []
+
+    def offer(self, key: str) -> None:
+        counts = self._counts
+        if key in counts:
+            counts[key] += 1
+            return
+        if len(counts) < self._k:
+            counts[key] = 1
+            self._errors[key] = 0
+            heappush(self._heap, (1, key))
+            return
+
+        heap = self._heap
+        while True:
+            count, victim = heappop(heap)
+            if counts[victim] == count:
+                break
+            heappush(heap, (counts[victim], victim))
+        del counts[victim], self._errors[victim]
+        counts[key] = count + 1
+        self._errors[key] = count
+        heappush(heap, (count + 1, key))
+
+    def top(self, n: int | None = None) -> list[tuple[str, int, int]]:
+        """(key, count, max overestimate) by descending count"""
+        ranked = sorted(self._counts.items(), key=lambda item: (-item[1], item[0]))
+        return [(key, count, self._errors[key]) for key, count in ranked[:n]]
+
+
+class LatencyHistogram:
+    """Log2-bucketed latency histogram; bucket i holds values in [2**(i-1), 2**i) ns"""
+    def __init__(self):
+        self._buckets = [0] * 64
+        self.count = 0
+        self.total_ns = 0
+
+    def record(self, ns: int) -> None:
+        self._buckets[min(ns.bit_length(), 63)] += 1
+        self.count += 1
+        self.total_ns += ns
+
+    def percentile(self, q: float) -> int:
+        """Upper bound (ns) of the bucket containing the q-quantile"""
+        if self.count == 0:
+            return 0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self._buckets):
+            seen += n
+            if seen >= rank and n:
+                return 1 << i
+        return 1 << 63
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ns": self.total_ns / self.count if self.count else 0.0,
+            "p50_ns": self.percentile(0.5),
+            "p99_ns": self.percentile(0.99),
+            "p999_ns": self.percentile(0.999),
+            "buckets": {1 << i: n for i, n in enumerate(self._buckets) if n},
+        }
+
+
+class RejectionQueue:
+    """Delivers rejected client ids to a (possibly slow) sink in batches from a daemon thread.
+
+    put() never blocks: when max_pending events are already queued the event is
+    dropped and counted in `dropped`.
+    """
+    def __init__(self, sink: Callable[[list[str]], None], batch_size: int = 1024,
+                 flush_interval: float = 0.1, max_pending: int = 100_000):
+        self._sink = sink
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._max_pending = max_pending
+        self._pending: deque[str] = deque()
+        self._wake = threading.Event()
+        self._closed = False
+        self.dropped = 0
+        self.sink_errors = 0
+        self._thread = threading.Thread(target=self._run, name="ratelimiter-rejections", daemon=True)
+        self._thread.start()
+
+    def put(self, client_id: str) -> None:
+        pending = self._pending
+        if len(pending) >= self._max_pending:
+            self.dropped += 1
+            return
+        pending.append(client_id)
+        if len(pending) == self._batch_size:
+            self._wake.set()
+
+    def _run(self) -> None:
+        while not self._closed:
+            self._wake.wait(self._flush_interval)
+            self._wake.clear()
+            self._drain()
+        self._drain()
+
+    def _drain(self) -> None:
+        pending = self._pending
+        while pending:
+            batch = []
+            while pending and len(batch) < self._batch_size:
+                batch.append(pending.popleft())
+            try:
+                self._sink(batch)
+            except Exception:
+                # A failing sink must not kill the delivery thread
+                self.sink_errors += 1
+
+    def close(self) -> None:
+        """Flush everything still queued and stop the thread"""
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+
+
+class RateLimiterMetrics:
+    """Aggregated decision metrics, attach with RateLimiter.instrument(metrics).
+
+    Counters are per strategy so one instance can be shared by several limiters.
+    Rejections also feed a top-k sketch and, if `rejection_sink` is given, a
+    RejectionQueue so the sink runs off the allow() path.
+    """
+    def __init__(self, top_k: int = 100, rejection_sink: Callable[[list[str]], None] | None = None,
+                 batch_size: int = 1024, flush_interval: float = 0.1):
+        self.allowed: defaultdict[str, int] = defaultdict(int)
+        self.rejected: defaultdict[str, int] = defaultdict(int)
+        self.top_rejected = SpaceSaving(top_k)
+        self.latency: defaultdict[str, LatencyHistogram] = defaultdict(LatencyHistogram)
+        self.rejections = (RejectionQueue(rejection_sink, batch_size, flush_interval)
+                           if rejection_sink is not None else None)
+
+    def record(self, strategy: str, client_id: str, allowed: bool, latency_ns: int) -> None:
+        if allowed:
+            self.allowed[strategy] += 1
+        else:
+            self.rejected[strategy] += 1
+            self.top_rejected.offer(client_id)
+            if self.rejections is not None:
+                self.rejections.put(client_id)
+        self.latency[strategy].record(latency_ns)
+
+    def snapshot(self, top_n: int = 10) -> dict:
+        return {
+            "allowed": dict(self.allowed),
+            "rejected": dict(self.rejected),
+            "top_rejected": self.top_rejected.top(top_n),
+            "latency": {strategy: hist.snapshot() for strategy, hist in self.latency.items()},
+            "rejections_dropped": self.rejections.dropped if self.rejections is not None else 0,
+        }
+
+    def close(self) -> None:
+        if self.rejections is not None:
+            self.rejections.close()
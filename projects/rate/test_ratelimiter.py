@@ -6,7 +6,8 @@ Run: pytest test_ratelimiter.py -k "TestLevel1" -v
 import time
 import pytest
 
-from ratelimiter import RateLimiter
+from ratelimiter import RateLimiter, CompositeRateLimiter, RateLimiterMetrics, SpaceSaving, LatencyHistogram
+from bench_ratelimiter import VirtualClock, simulate, poisson_trace, bursty_trace, diurnal_trace
 
 
 # ============================================================
@@ -295,3 +296,302 @@ class TestLevel4:
         rl.allow("a")  # rejected again
         rl.allow("b")  # rejected
         assert rejected == ["a", "a", "b"]
+
+
+# ============================================================
+# Level 5: Composite (hierarchical) limits
+# ============================================================
+
+class TestLevel5:
+    def _chain(self):
+        user = RateLimiter(max_requests=2, window_seconds=10)
+        tenant = RateLimiter(max_requests=3, window_seconds=10, strategy="sliding_log")
+        glob = RateLimiter(max_requests=10, window_seconds=10, strategy="token_bucket",
+                           bucket_capacity=10, refill_rate=1)
+        return user, tenant, glob, CompositeRateLimiter([user, tenant, glob])
+
+    def test_all_limits_admit(self):
+        _, _, _, rl = self._chain()
+        assert rl.allow(["u1", "t1", "global"]) is True
+        assert rl.allow(["u1", "t1", "global"]) is True
+        assert rl.allow(["u1", "t1", "global"]) is False  # user limit
+
+    def test_rejection_does_not_consume_earlier_limits(self):
+        user, tenant, _, rl = self._chain()
+        assert rl.allow(["u1", "t1", "global"]) is True
+        assert rl.allow(["u2", "t1", "global"]) is True
+        assert rl.allow(["u3", "t1", "global"]) is True
+        # tenant exhausted: u4 must keep its full user allowance
+        assert rl.allow(["u4", "t1", "global"]) is False
+        assert user.remaining("u4") == 2
+        assert tenant.remaining("t1") == 0
+
+    def test_single_key_applies_to_all(self):
+        _, tenant, _, rl = self._chain()
+        assert rl.allow("x") is True
+        assert tenant.remaining("x") == 2
+
+    def test_remaining_is_min(self):
+        _, _, _, rl = self._chain()
+        rl.allow(["u1", "t1", "global"])
+        assert rl.remaining(["u1", "t1", "global"]) == 1
+
+    def test_retry_after_is_max(self):
+        user = RateLimiter(max_requests=1, window_seconds=1, strategy="sliding_log")
+        tenant = RateLimiter(max_requests=1, window_seconds=5, strategy="sliding_log")
+        rl = CompositeRateLimiter([user, tenant])
+        assert rl.retry_after(["u", "t"]) is None
+        rl.allow(["u", "t"])
+        retry = rl.retry_after(["u", "t"])
+        assert retry is not None
+        assert 1.0 < retry <= 5.0
+
+    def test_on_reject_reports_rejecting_key(self):
+        rejected = []
+        _, _, _, rl = self._chain()
+        rl.on_reject(lambda key: rejected.append(key))
+        for _ in range(3):
+            rl.allow(["u1", "t1", "global"])
+        assert rejected == ["u1"]
+
+    def test_wrong_number_of_keys(self):
+        _, _, _, rl = self._chain()
+        with pytest.raises(ValueError):
+            rl.allow(["u1", "t1"])
+
+
+# ============================================================
+# Level 6: Injectable clock + simulation harness
+# ============================================================
+
+class TestLevel6:
+    def test_virtual_clock_window_reset(self):
+        clock = VirtualClock(start=100.0)
+        rl = RateLimiter(max_requests=1, window_seconds=10, clock=clock)
+        assert rl.allow("c") is True
+        assert rl.allow("c") is False
+        assert rl.retry_after("c") == pytest.approx(10.0)
+        clock.advance(10)
+        assert rl.allow("c") is True
+
+    def test_virtual_clock_token_bucket(self):
+        clock = VirtualClock()
+        rl = RateLimiter(max_requests=2, window_seconds=1, strategy="token_bucket",
+                         bucket_capacity=2, refill_rate=2, clock=clock)
+        assert rl.allow("c") is True
+        assert rl.allow("c") is True
+        assert rl.allow("c") is False
+        clock.advance(0.5)
+        assert rl.allow("c") is True
+
+    def test_composite_shares_clock(self):
+        clock = VirtualClock()
+        user = RateLimiter(max_requests=1, window_seconds=10, strategy="sliding_log", clock=clock)
+        rl = CompositeRateLimiter([user])
+        assert rl.allow("u") is True
+        assert rl.allow("u") is False
+        clock.advance(11)
+        assert rl.allow("u") is True
+
+    def test_fixed_window_boundary_burst(self):
+        # 2x limit arrives around the t=10 boundary
+        trace = [(9.5 + i * 0.01, "c") for i in range(100)]
+        fixed = simulate("fixed", trace, max_requests=50, window_seconds=10)
+        sliding = simulate("sliding_log", trace, max_requests=50, window_seconds=10)
+        assert fixed.peak_ratio == 2.0
+        assert sliding.peak_ratio == 1.0
+
+    def test_simulate_reports_metrics(self):
+        trace = poisson_trace(rate=5, duration=60, clients=3)
+        r = simulate("token_bucket", trace, max_requests=10, window_seconds=1)
+        assert r.decisions == len(trace)
+        assert r.admitted <= r.decisions
+        assert r.decisions_per_sec > 0
+        assert r.bytes_per_client > 0
+
+    def test_traces_sorted(self):
+        for trace in (bursty_trace(1, 50, 10, 1, 60, clients=2),
+                      diurnal_trace(10, 60, period=30, clients=2)):
+            times = [t for t, _ in trace]
+            assert times == sorted(times)
+            assert all(0 <= t < 60 for t in times)
+
+
+# ============================================================
+# Level 7: Snapshot / restore
+# ============================================================
+
+class TestLevel7:
+    def _limiter(self, strategy, clock):
+        return RateLimiter(max_requests=3, window_seconds=10, strategy=strategy,
+                           bucket_capacity=3, refill_rate=0.1, clock=clock)
+
+    @pytest.mark.parametrize("strategy", ["fixed", "sliding_log", "token_bucket"])
+    def test_restore_keeps_limits(self, strategy):
+        clock = VirtualClock(1_000.0)
+        rl = self._limiter(strategy, clock)
+        for _ in range(3):
+            rl.allow("abuser")
+            clock.advance(0.25)
+        rl.allow("light")
+
+        restored = self._limiter(strategy, clock)
+        restored.restore(rl.snapshot())
+        assert restored.allow("abuser") is False
+        assert restored.remaining("light") == 2
+        assert restored.remaining("new") == 3
+
+    def test_sliding_log_timestamps_roundtrip(self):
+        clock = VirtualClock(1_700_000_000.123456)
+        rl = self._limiter("sliding_log", clock)
+        for _ in range(3):
+            rl.allow("c")
+            clock.advance(0.333333)
+        restored = self._limiter("sliding_log", clock)
+        restored.restore(rl.snapshot())
+        assert list(restored._logs["c"]) == pytest.approx(list(rl._logs["c"]), abs=1e-6)
+        assert restored.retry_after("c") == pytest.approx(rl.retry_after("c"), abs=1e-6)
+
+    def test_snapshot_of_restored_limiter(self):
+        """Clients that were never touched after restore must survive the next snapshot."""
+        clock = VirtualClock(50.0)
+        rl = self._limiter("token_bucket", clock)
+        for client in ("a", "b", "c"):
+            rl.allow(client)
+        restored = self._limiter("token_bucket", clock)
+        restored.restore(rl.snapshot())
+        restored.allow("b")
+        again = self._limiter("token_bucket", clock)
+        again.restore(restored.snapshot())
+        assert again.remaining("a") == 2
+        assert again.remaining("b") == 1
+        assert "c" in again._buckets
+
+    def test_save_and_load(self, tmp_path):
+        clock = VirtualClock(20.0)
+        rl = self._limiter("fixed", clock)
+        rl.allow("c")
+        path = str(tmp_path / "limits.bin")
+        rl.save(path)
+        restored = self._limiter("fixed", clock)
+        restored.load(path)
+        assert restored.remaining("c") == 2
+
+    def test_background_checkpointing(self, tmp_path):
+        rl = RateLimiter(max_requests=5, window_seconds=10)
+        path = tmp_path / "limits.bin"
+        rl.allow("c")
+        rl.start_checkpointing(str(path), interval_seconds=0.05)
+        try:
+            deadline = time.time() + 2
+            while not path.exists() and time.time() < deadline:
+                time.sleep(0.01)
+        finally:
+            rl.stop_checkpointing()
+        restored = RateLimiter(max_requests=5, window_seconds=10)
+        restored.load(str(path))
+        assert restored.remaining("c") == 4
+
+    def test_restore_rejects_garbage(self):
+        rl = RateLimiter(max_requests=5, window_seconds=10)
+        with pytest.raises(ValueError):
+            rl.restore(b"nope" + bytes(16))
+
+    def test_nul_in_client_id(self):
+        rl = RateLimiter(max_requests=5, window_seconds=10)
+        rl.allow("bad\0id")
+        with pytest.raises(ValueError):
+            rl.snapshot()
+
+
+# ============================================================
+# Level 8: Observability
+# ============================================================
+
+class TestLevel8:
+    def test_counters_per_strategy(self):
+        metrics = RateLimiterMetrics()
+        fixed = RateLimiter(max_requests=1, window_seconds=10)
+        sliding = RateLimiter(max_requests=2, window_seconds=10, strategy="sliding_log")
+        fixed.instrument(metrics)
+        sliding.instrument(metrics)
+        for _ in range(3):
+            fixed.allow("a")
+            sliding.allow("a")
+        snap = metrics.snapshot()
+        assert snap["allowed"] == {"fixed": 1, "sliding_log": 2}
+        assert snap["rejected"] == {"fixed": 2, "sliding_log": 1}
+        assert snap["latency"]["fixed"]["count"] == 3
+
+    def test_top_rejected(self):
+        metrics = RateLimiterMetrics(top_k=2)
+        rl = RateLimiter(max_requests=1, window_seconds=10)
+        rl.instrument(metrics)
+        for client, n in (("heavy", 50), ("medium", 10), ("x", 3), ("y", 3)):
+            for _ in range(n):
+                rl.allow(client)
+        top = metrics.top_rejected.top()
+        assert top[0][0] == "heavy"
+        assert top[0][1] == 49
+
+    def test_space_saving_error_bound(self):
+        sketch = SpaceSaving(3)
+        stream = ["a"] * 20 + ["b"] * 10 + list("cdefgh") + ["a"] * 5
+        for key in stream:
+            sketch.offer(key)
+        for key, count, error in sketch.top():
+            true = stream.count(key)
+            assert count - error <= true <= count
+        assert sketch.top(1)[0][0] == "a"
+
+    def test_latency_histogram(self):
+        hist = LatencyHistogram()
+        for ns in [100] * 99 + [1_000_000]:
+            hist.record(ns)
+        assert hist.percentile(0.5) == 128
+        assert hist.percentile(1.0) == 1 << 20
+
+    def test_async_rejection_queue(self):
+        batches = []
+
+        def slow_sink(batch):
+            time.sleep(0.05)
+            batches.append(batch)
+
+        metrics = RateLimiterMetrics(rejection_sink=slow_sink, batch_size=10, flush_interval=0.01)
+        rl = RateLimiter(max_requests=1, window_seconds=10)
+        rl.instrument(metrics)
+        start = time.time()
+        for _ in range(26):
+            rl.allow("c")
+        assert time.time() - start < 0.05  # sink never ran inline
+        metrics.close()
+        assert sum(len(batch) for batch in batches) == 25
+        assert all(len(batch) <= 10 for batch in batches)
+
+    def test_failing_sink_does_not_stop_delivery(self):
+        delivered = []
+
+        def flaky_sink(batch):
+            if not delivered:
+                delivered.append(None)
+                raise RuntimeError("sink down")
+            delivered.extend(batch)
+
+        metrics = RateLimiterMetrics(rejection_sink=flaky_sink, batch_size=1, flush_interval=0.01)
+        rl = RateLimiter(max_requests=0, window_seconds=10)
+        rl.instrument(metrics)
+        rl.allow("a")
+        rl.allow("b")
+        metrics.close()
+        assert metrics.rejections.sink_errors == 1
+        assert delivered[1:] == ["b"]
+
+    def test_composite_instrumented(self):
+        metrics = RateLimiterMetrics()
+        rl = CompositeRateLimiter([RateLimiter(max_requests=1, window_seconds=10)])
+        rl.instrument(metrics)
+        rl.allow("u")
+        rl.allow("u")
+        assert metrics.snapshot()["allowed"] == {"composite": 1}
+        assert metrics.snapshot()["rejected"] == {"composite": 1}